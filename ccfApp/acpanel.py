@@ -22,12 +22,27 @@ import sys
 import json
 import time
 import numpy as np
-from os import path, getenv, listdir
+from os import path, listdir, makedirs
 
 from info_ac import InfoAC
 from info_delta import InfoDelta
 from formationcontrol import FormationControlWorker
 from log_reporter import LogReporter
+from fleet_state import FleetState
+from fleet_registry import FleetRegistry
+from fleet_init import FleetInitializer
+import settings_cache
+from link_health import LinkHealthMonitor
+from ui_coalescer import UpdateCoalescer
+from dl_requests import DLValueTracker
+from command_filter import RadiusCommandFilter
+from latency import LatencyTracker, STAGES, PERCENTILES
+from metrics import serve, BusMetrics
+from outbound import OutboundScheduler, CONTROL, SETTINGS, POLL, PRIORITY_NAMES
+import recorder as rec
+from profiler import ProfilingSession
+from ccf_kernel import SparseIncidence
+from ccf_scheduler import clamp_rate, FreshnessTrigger
 
 from PySide6.QtCore import QObject, Property, Signal, Slot, QThread
 from PySide6.QtQml import QmlElement, QmlSingleton
@@ -37,18 +52,17 @@ QML_IMPORT_MAJOR_VERSION = 1
 
 MAIN_PATH = path.dirname(__file__)
 JSON_FOLDER = path.join(MAIN_PATH, "formation")
-
-PPRZ_HOME = getenv("PAPARAZZI_HOME")
-PPRZ_SRC = getenv("PAPARAZZI_SRC")
+RECORD_FOLDER = path.join(MAIN_PATH, "records")
+PROFILE_FOLDER = path.join(MAIN_PATH, "profiles")
+RECORD_ON_START = False # set by ccf_app.py -record
+TRANSPORT = None # "ivy", "udp" or "local" (ccf_app.py -transport), CCF_TRANSPORT by default
+UDP_LINKS = None # "ac_id:out_port:in_port,..." (ccf_app.py -udp_links), CCF_UDP_LINKS by default
+METRICS_PORT = None # Prometheus endpoint port (ccf_app.py -metrics), CCF_METRICS_PORT by default
 
 sys.path.append(MAIN_PATH)
-sys.path.append(PPRZ_HOME + "/var/lib/python/")
-sys.path.append(PPRZ_SRC + "/sw/lib/python")
 
-# --- PprzLink
-from pprzlink.ivy import IvyMessagesInterface
-from pprzlink.message import PprzMessage
-from settings_xml_parse import PaparazziACSettings
+# --- PprzLink (through the pluggable transports)
+from transport import open_interface, LocalInterface, Message as PprzMessage
 # ---
 
 """\
@@ -58,13 +72,29 @@ class ConfigCCF:
     def __init__(self):
         self.ac_info_list = []
         self.delta_info_list = []
+        self.fleet = FleetState(0)
         self.ccfstate = False
 
         # CCF controller parameters
         self.B = np.array([])
+        self.incidence = None
         self.k = 1.
         self.radius = 90.
         self.u_max = 20
+        self.rate = 1. # Hz
+        self.event_mode = False # Step on fresh positions instead of a fixed period
+        self.fresh_trigger = None
+        self.predict = False # Latency-compensating position predictor
+        self.coalescer = None
+        self.clock = time.monotonic # Receive/control timestamps (a virtual clock on replays)
+
+        # Radius commands filter
+        self.cmd_deadband = 0.5 # meters
+        self.cmd_refresh = 2. # secconds
+        self.cmd_filter = RadiusCommandFilter(0)
+
+        # Telemetry receipt -> radius command latency histograms
+        self.latency = LatencyTracker(0)
 
         # CCF output
         self.u_list = np.array([])
@@ -86,8 +116,17 @@ class ACPanel(QObject):
     ccfstate_changed = Signal()
     kccf_changed = Signal()
     umax_changed = Signal()
-
-    def __init__(self) -> None:
+    rate_changed = Signal()
+    event_mode_changed = Signal()
+    ccf_timing_changed = Signal()
+    link_health_changed = Signal()
+    ui_stats_changed = Signal()
+    recording_changed = Signal()
+    latency_changed = Signal()
+    profiling_changed = Signal()
+    init_progress_changed = Signal()
+
+    def __init__(self, interface=None) -> None:
         super().__init__()
         # Common config (ACPanel + CCF worker)
         self.conf = ConfigCCF()
@@ -97,24 +136,138 @@ class ACPanel(QObject):
         self.json_file = self._json_file
         self._ac_ids = []
         self._delta_list = [] # in deg!!
+        self._settings_ids = None # Known setting indexes, skipping the settings XML lookup
+        self.registry = FleetRegistry()
+
+        # Telemetry recorder and profiling capture (None while not running)
+        self.recorder = None
+        self.profiling_session = None
 
-        # Start IVY Bus interface
-        self._step = 1/10
-        try:
-            self.interface = IvyMessagesInterface("CCF Application")
-            self.interface.subscribe(self.dl_values_cb, PprzMessage("telemetry", "DL_VALUE"))
-            self.interface.subscribe(self.gvf_cb, PprzMessage("telemetry", "GVF"))
-            self.interface.subscribe(self.navigation_cb, PprzMessage("telemetry", "NAVIGATION")) # fixedwing
-            self.interface.subscribe(self.rotorcraft_fp_cb, PprzMessage("telemetry", "ROTORCRAFT_FP")) # rover/rotorcraft
-        except:
-            print("fail")
-        
         # Log message
         self.log_reporter = LogReporter("INFO: Control Panel backend successfully initilized - ")
 
+        # Start the bus interface (or use the given one, e.g. a fake bus for benchmarks)
+        try:
+            if interface is None:
+                interface = open_interface("CCF Application", TRANSPORT, udp_links=UDP_LINKS)
+            self.interface = interface
+        except Exception as e:
+            self.interface = LocalInterface("CCF Application")
+            self.log_reporter.log("ERROR: {} - running on the local bus -".format(e))
+
+        # Local metrics endpoint (None if not enabled)
+        self.metrics, self.metrics_server = serve(METRICS_PORT)
+        self.bus_metrics = None if self.metrics is None else BusMetrics(self.metrics)
+
+        self.subscribe(self.dl_values_cb, PprzMessage("telemetry", "DL_VALUE"))
+        self.subscribe(self.gvf_cb, PprzMessage("telemetry", "GVF"))
+        self.subscribe(self.navigation_cb, PprzMessage("telemetry", "NAVIGATION")) # fixedwing
+        self.subscribe(self.rotorcraft_fp_cb, PprzMessage("telemetry", "ROTORCRAFT_FP")) # rover/rotorcraft
+
+        # Every outbound msg goes through a single prioritized sender thread
+        self.outbound = OutboundScheduler(self.interface, rate=20., burst=10, on_sent=self.msg_sent_cb,
+                                          log_reporter=self.log_reporter)
+        self.outbound.start()
+
+        # Qt notifications coalesced into one refresh per UI frame
+        self.coalescer = UpdateCoalescer(rate_hz=30)
+        self.coalescer.stats_changed.connect(self.ui_stats_changed)
+        self.coalescer.start()
+        self.conf.coalescer = self.coalescer
+
+        # NAV/GVF link-health monitor
+        self.link_monitor = LinkHealthMonitor(self.log_reporter, clock=lambda: self.conf.clock())
+        self.link_monitor.health_changed.connect(self.link_health_changed)
+        self.link_monitor.start()
+
+        # Pipelined GET_DL_SETTING requests (rate limited, with retries)
+        self.dl_tracker = DLValueTracker(self.get_dl_value, self.log_reporter, rate=200., timeout=1., retries=3)
+        self.dl_tracker.ac_done.connect(self.dl_values_done)
+
+        # Settings of the loaded fleet resolved in a worker pool (ac_info_init)
+        self.fleet_init = FleetInitializer()
+        self._t_init = time.monotonic()
+        self.fleet_init.resolved.connect(self.ac_settings_resolved)
+        self.fleet_init.progress_changed.connect(self.init_progress_changed)
+
         # CCF worker
         self.ccf_worker = None
         self.ccf_thread = None
+        self._ccf_timing = "-"
+
+        if self.metrics is not None:
+            self.init_metrics(self.metrics)
+            self.log_reporter.log("INFO: metrics served on http://{:s}:{:d}/metrics -".format(
+                self.metrics_server.server.server_address[0], self.metrics_server.port))
+
+        if RECORD_ON_START:
+            self.start_recording()
+
+    # Bus subscription (timed and counted when the metrics endpoint is on)
+    def subscribe(self, callback, msg):
+        if self.bus_metrics is not None:
+            callback = self.bus_metrics.wrap(callback)
+        self.interface.subscribe(callback, msg)
+
+    # Metrics read from the panel components at scrape time
+    def init_metrics(self, m):
+        # {(stream, ac_id): value} of a LinkStream array
+        def link_values(attr):
+            ids = [ac_info.ac.id for ac_info in self.link_monitor.ac_info_list]
+            values = {}
+            for stream in (self.link_monitor.nav, self.link_monitor.gvf):
+                values.update(((stream.name, ac_id), float(v)) for ac_id, v in zip(ids, getattr(stream, attr)))
+            return values
+
+        # Stats of the running (or last) CCF worker
+        def tick_stat(attr):
+            worker = self.ccf_worker
+            return 0 if worker is None else getattr(worker.scheduler.stats, attr)
+
+        m.gauge_fn("running", "CCF control loop running", lambda: self.conf.ccfstate)
+        m.gauge_fn("aircraft", "Aircraft in the loaded formation", lambda: self.conf.fleet.n_ac)
+        m.counter_fn("ticks_total", "CCF control ticks", lambda: tick_stat("ticks"))
+        m.counter_fn("tick_overruns_total", "CCF ticks finished after the next deadline",
+                     lambda: tick_stat("overruns"))
+        m.counter_fn("ticks_skipped_total", "CCF deadlines skipped by overruns", lambda: tick_stat("skipped"))
+        m.gauge_fn("tick_seconds", "CCF tick duration (last, mean and max)",
+                   lambda: {("last",): tick_stat("compute"), ("mean",): tick_stat("compute_mean"),
+                            ("max",): tick_stat("compute_max")}, ("stat",))
+        m.gauge_fn("tick_jitter_seconds", "CCF tick start delay from its deadline (mean)",
+                   lambda: tick_stat("jitter_mean"))
+
+        for name, attr, help in (("link_up", "up", "Link state (1 up, 0 down)"),
+                                 ("link_rate_hz", "rate", "Message rate"),
+                                 ("link_age_seconds", "age", "Age of the last message")):
+            m.gauge_fn(name, help, lambda attr=attr: link_values(attr), ("stream", "ac_id"))
+
+        m.counter_fn("outbound_sent_total", "Messages sent by the outbound scheduler",
+                     lambda: {(name,): n for name, n in zip(PRIORITY_NAMES, self.outbound.sent)}, ("priority",))
+        m.counter_fn("outbound_replaced_total", "Queued messages replaced by a newer value",
+                     lambda: self.outbound.replaced)
+        m.gauge_fn("outbound_queued", "Messages waiting in the outbound queues", self.outbound.queued)
+        m.counter_fn("outbound_errors_total", "Messages the outbound scheduler failed to send",
+                     lambda: self.outbound.errors)
+        m.counter_fn("radius_cmd_msgs_total", "Radius command DL_SETTINGs sent/suppressed by the deadband filter",
+                     lambda: {("sent",): self.conf.cmd_filter.sent,
+                              ("suppressed",): self.conf.cmd_filter.suppressed}, ("state",))
+        m.gauge_fn("latency_seconds", "Age of the positions along the control path (fleet percentiles)",
+                   self.latency_metrics, ("stage", "quantile"))
+
+        m.counter_fn("ui_notifications_total", "Qt notifications requested/emitted/dropped by the coalescer",
+                     lambda: {("requested",): self.coalescer.requested, ("emitted",): self.coalescer.emitted,
+                              ("dropped",): self.coalescer.dropped}, ("state",))
+        m.counter_fn("log_lines_total", "Lines written to the log console", lambda: self.log_reporter.count)
+        m.gauge_fn("log_bytes", "Size of the log console", lambda: len(self.log_reporter.full_log))
+
+    def latency_metrics(self):
+        values = {}
+        for k, stage in enumerate(STAGES):
+            p = self.conf.latency.percentiles(k)
+            if p is not None:
+                for q, v in zip(PERCENTILES, p):
+                    values[(stage, "{:.2f}".format(q / 100))] = v
+        return values
 
     def init_json_file(self):
         json_files = [f for f in listdir(JSON_FOLDER) if f.endswith('.json')]
@@ -155,6 +308,50 @@ class ACPanel(QObject):
     def u_max(self):
         return self.conf.u_max
     
+    @Property(float, notify=rate_changed)
+    def ccf_rate(self):
+        return self.conf.rate
+
+    @Property(bool, notify=event_mode_changed)
+    def ccf_event_mode(self):
+        return self.conf.event_mode
+
+    @Property(str, notify=ccf_timing_changed)
+    def ccf_timing(self):
+        return self._ccf_timing
+
+    @Property(str, notify=link_health_changed)
+    def link_health(self):
+        return self.link_monitor.summary
+
+    @Property(str, notify=ui_stats_changed)
+    def ui_stats(self):
+        return self.coalescer.summary()
+
+    @Property(str, notify=ui_stats_changed)
+    def cmd_stats(self):
+        return self.conf.cmd_filter.summary() + " | " + self.outbound.summary()
+
+    @Property(str, notify=latency_changed)
+    def latency_stats(self):
+        return self.conf.latency.summary()
+
+    @Property(bool, notify=recording_changed)
+    def recording(self):
+        return self.recorder is not None
+
+    @Property(float, notify=init_progress_changed)
+    def init_progress(self):
+        return self.fleet_init.progress
+
+    @Property(bool, notify=init_progress_changed)
+    def init_busy(self):
+        return self.fleet_init.busy
+
+    @Property(bool, notify=profiling_changed)
+    def profiling(self):
+        return self.profiling_session is not None
+
     @Property(bool, notify=ccfstate_changed)
     def ccfstate(self):
         return self.conf.ccfstate
@@ -192,6 +389,19 @@ class ACPanel(QObject):
         self.umax_changed.emit()
         self.log_reporter.log("INFO: u_max={:.1f} successfully commited -".format(value))
 
+    @ccf_rate.setter
+    def ccf_rate(self, value):
+        self.conf.rate = clamp_rate(value)
+        self.rate_changed.emit()
+        self.log_reporter.log("INFO: ccf_rate={:.1f} Hz successfully commited -".format(self.conf.rate))
+
+    @ccf_event_mode.setter
+    def ccf_event_mode(self, value):
+        self.conf.event_mode = value
+        self.event_mode_changed.emit()
+        self.log_reporter.log("INFO: CCF {:s} mode selected (applied on next launch) -".format(
+            "event-driven" if value else "periodic"))
+
 
     # ----- AC Panel slots
 
@@ -205,20 +415,61 @@ class ACPanel(QObject):
                 self._ac_ids = config['ids']
                 self._delta_list = config['desired_intervehicle_angles_degrees']
                 self.conf.B = np.array(config['topology'])
+                self.conf.incidence = SparseIncidence(self.conf.B)
                 self.conf.k = config['gain']
                 self.conf.radius = config['desired_stationary_radius_meters']
                 self.conf.u_max = 0.2 * self.conf.radius
+                self.conf.rate = clamp_rate(config.get('control_rate_hz', 1.))
+                self.conf.event_mode = config.get('control_mode', "periodic") == "event"
+                self.conf.predict = bool(config.get('predict_positions', False))
+                self.conf.cmd_deadband = float(config.get('radius_deadband_meters', 0.5))
+                self.conf.cmd_refresh = float(config.get('radius_refresh_seconds', 2.))
+                self._settings_ids = config.get('settings_ids')
             self.kccf_changed.emit()
             self.umax_changed.emit()
+            self.rate_changed.emit()
+            self.event_mode_changed.emit()
             self.log_reporter.log("INFO: {:s} successfully loaded -".format(self._json_file))
         except:
             self.log_reporter.log("ERROR: error while loading {:s} -".format(self._json_path))
 
+    # The AC with unknown setting indexes are listed at once and resolved in the
+    # worker pool: each one becomes usable as soon as its own settings are ready
     @Slot()
     def ac_info_init(self):
-        self.conf.ac_info_list = [InfoAC(i, self.log_reporter) for i in self._ac_ids]
+        self.conf.fresh_trigger = None
+        self.conf.fleet = FleetState(len(self._ac_ids))
+        self.conf.ac_info_list = [InfoAC(ac_id, self.log_reporter, self.conf.fleet, slot, self._settings_ids, lookup=False)
+                                  for slot, ac_id in enumerate(self._ac_ids)]
+        self.conf.cmd_filter = RadiusCommandFilter(len(self._ac_ids), self.conf.cmd_deadband, self.conf.cmd_refresh)
+        self.conf.latency = LatencyTracker(len(self._ac_ids), self._ac_ids)
+
+        self.registry = FleetRegistry(self._ac_ids)
+        self.link_monitor.reset(self.conf.fleet, self.conf.ac_info_list)
+        if self._settings_ids is None:
+            self._t_init = time.monotonic()
+            self.fleet_init.start(self.conf.ac_info_list)
+        else:
+            for ac_info in self.conf.ac_info_list:
+                self.registry.register_settings(ac_info.ac.id, ac_info.ac._settings_ids)
         self.ac_info_updated.emit()
 
+    # Settings of one AC resolved (GUI thread): register them and ask for its DL_VALUEs
+    @Slot(object, object)
+    def ac_settings_resolved(self, ac_info, settings):
+        if isinstance(settings, Exception):
+            ac_info.settings_lookup_failed(settings)
+            ac_info.status = True
+        elif ac_info.apply_setting_ids(settings):
+            self.registry.register_settings(ac_info.ac.id, ac_info.ac._settings_ids)
+            self.request_dl_values(ac_info.ac.id)
+        else:
+            ac_info.status = True
+
+        if not self.fleet_init.busy:
+            self.log_reporter.log("INFO: settings of {:d} AC resolved in {:.2f} s ({:s}) -".format(
+                self.fleet_init.total, time.monotonic() - self._t_init, settings_cache.default_cache().summary()))
+
     @Slot()
     def delta_info_init(self):
         B = self.conf.B.T
@@ -251,13 +502,20 @@ class ACPanel(QObject):
         self.conf.ccfstate = not self.conf.ccfstate
         self.ccfstate_changed.emit()
 
-    # After launch checks (check box, NAV and GVF status of every AC must be OK to launch CCF)
+    # After launch checks (resolved settings, check box, NAV and GVF status of every AC must be OK to launch CCF)
     def check_ac_states(self):
         if len(self.conf.ac_info_list) == 0:
             return False    
-        
+
+        if self.fleet_init.busy:
+            self.log_reporter.log("INFO: Waiting for the settings of the fleet to be resolved -")
+            return False
+
         for ac_info in self.conf.ac_info_list:
             ac = ac_info.ac
+            if None in ac._settings_ids.values():
+                self.log_reporter.log("ERROR: AC-{:d} setting indexes are unknown, the CCF can not command it -".format(ac.id))
+                return False
             if (not ac.info_checked):
                 self.log_reporter.log("INFO: Waiting for check of AC-{:d} -".format(ac.id))
                 return False
@@ -284,17 +542,36 @@ class ACPanel(QObject):
 
     # LAUNCH CCF!!
     def launch_ccf(self):
+        self.conf.fresh_trigger = FreshnessTrigger(len(self.conf.ac_info_list))
+
         self.ccf_thread = QThread()
         self.ccf_worker = FormationControlWorker(self.conf, self.log_reporter)
         self.ccf_worker.moveToThread(self.ccf_thread)
 
         self.ccf_thread.started.connect(self.ccf_worker.run)
         self.ccf_worker.progress.connect(self.commit_all_ac_rad)
+        self.ccf_worker.timing_updated.connect(self.update_ccf_timing)
         self.ccf_worker.finished.connect(self.ccf_thread.quit)
         
         self.ccf_thread.start() # Go Go Go!
+        self.conf.latency.reset()
         self.log_reporter.log("INFO: CCF thread created -")
     
+    # Timing stats reported by the CCF worker
+    @Slot(str)
+    def update_ccf_timing(self, summary):
+        self._ccf_timing = summary
+        self.ccf_timing_changed.emit()
+        self.update_latency()
+
+    # Refresh the per-AC latency percentiles shown in the panel
+    def update_latency(self):
+        latency = self.conf.latency
+        for ac_info in self.conf.ac_info_list:
+            ac_info._latency = latency.summary(ac_info.ac.slot)
+            self.coalescer.mark(ac_info, "ac_latency_updated")
+        self.latency_changed.emit()
+
     # STOP CCF!!
     @Slot()
     def stop_ccf(self):
@@ -310,12 +587,112 @@ class ACPanel(QObject):
             self.ccf_thread.wait()
 
 
+    # ----- Telemetry recording
+
+    @Slot()
+    def start_recording(self):
+        if self.recorder is not None:
+            return
+        makedirs(RECORD_FOLDER, exist_ok=True)
+        filename = path.join(RECORD_FOLDER, time.strftime("ccf_%Y%m%d_%H%M%S.ccfrec"))
+        try:
+            recorder = rec.TelemetryRecorder(filename, clock=lambda: self.conf.clock(), log_reporter=self.log_reporter)
+            recorder.start()
+        except OSError:
+            self.log_reporter.log("ERROR: could not open {:s} -".format(filename))
+            return
+        self.recorder = recorder
+        self.recording_changed.emit()
+        self.log_reporter.log("INFO: recording telemetry to {:s} -".format(filename))
+
+    @Slot()
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return
+        error = recorder.stop()
+        self.recording_changed.emit()
+        if error is not None:
+            self.log_reporter.log("ERROR: recording failed ({:s}), only {:d} records saved to {:s}, {:d} dropped -".format(
+                str(error), recorder.written, recorder.filename, recorder.dropped))
+        else:
+            self.log_reporter.log("INFO: {:d} records saved to {:s} -".format(recorder.written, recorder.filename))
+
+    @Slot()
+    def toggle_recording(self):
+        if self.recorder is None:
+            self.start_recording()
+        else:
+            self.stop_recording()
+
+
+    # ----- Profiling (cProfile of the GUI thread, sampling of every thread, tracemalloc, CPU per thread)
+
+    @Slot()
+    def start_profiling(self):
+        if self.profiling_session is not None:
+            return
+        makedirs(PROFILE_FOLDER, exist_ok=True)
+        prefix = path.join(PROFILE_FOLDER, time.strftime("profile_%Y%m%d_%H%M%S"))
+        session = ProfilingSession(prefix, self.thread_names)
+        session.start()
+        self.profiling_session = session
+        self.profiling_changed.emit()
+        self.log_reporter.log("INFO: profiling started -")
+
+    @Slot()
+    def stop_profiling(self):
+        session, self.profiling_session = self.profiling_session, None
+        if session is None:
+            return
+        try:
+            files = session.stop()
+        except OSError:
+            self.log_reporter.log("ERROR: could not write the profile {:s} -".format(session.prefix))
+            files = []
+        self.profiling_changed.emit()
+        if files:
+            self.log_reporter.log("INFO: profile saved to {:s}_* -".format(session.prefix))
+
+    @Slot()
+    def toggle_profiling(self):
+        if self.profiling_session is None:
+            self.start_profiling()
+        else:
+            self.stop_profiling()
+
+    # Names of the threads that the threading module doesn't know
+    def thread_names(self):
+        names = {}
+        if self.ccf_worker is not None and self.ccf_worker.thread_ident is not None:
+            names[self.ccf_worker.thread_ident] = "CCF"
+        return names
+
+    # Dump the latency histograms of the current run (latency.py compares two dumps)
+    @Slot()
+    def dump_latency(self):
+        makedirs(RECORD_FOLDER, exist_ok=True)
+        filename = path.join(RECORD_FOLDER, time.strftime("latency_%Y%m%d_%H%M%S.json"))
+        try:
+            self.conf.latency.dump(filename)
+        except OSError:
+            self.log_reporter.log("ERROR: could not write {:s} -".format(filename))
+            return
+        self.log_reporter.log("INFO: latency {:s} saved to {:s} -".format(self.conf.latency.summary(), filename))
+
+
     #####################################################
     # IVY BUS slots                                     #
     #####################################################
     
     @Slot()
     def stop_ivy_interface(self):
+        self.stop_profiling()
+        self.fleet_init.stop()
+        self.outbound.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.stop_recording()
         self.interface.shutdown()
 
     # ######### MSG senders #########
@@ -325,33 +702,52 @@ class ACPanel(QObject):
         msg = PprzMessage("ground", "GET_DL_SETTING")
         msg['ac_id'] = ac_id
         msg["index"] = msg_id
-        self.interface.send(msg)
+        self.outbound.send(ac_id, msg, POLL, key=(ac_id, msg_id))
 
-    # Msg to send a new settings' value
-    def send_dl_setting(self, ac_id, msg_id, value):
+    # Msg to send a new settings' value (a queued value of the same setting is replaced)
+    def send_dl_setting(self, ac_id, msg_id, value, priority=SETTINGS):
         msg = PprzMessage("ground", "DL_SETTING")
         msg['ac_id'] = ac_id
         msg['index'] = msg_id
         msg['value'] = value
-        self.interface.send(msg)
+        self.outbound.send(ac_id, msg, priority, key=(ac_id, msg_id))
 
     # ######### Commit slots #########
 
+    # Queue the DL_VALUE requests of one AC (the replies are tracked by dl_tracker)
+    def request_dl_values(self, ac_id):
+        i = self.registry.slot(ac_id)
+        if i is None:
+            return
+        ac_info = self.conf.ac_info_list[i]
+        indexes = [index for index in ac_info.ac._settings_ids.values() if index is not None]
+        if not indexes:
+            return # settings not resolved (yet)
+        ac_info.status = False
+        self.dl_tracker.request(ac_id, indexes)
+
     @Slot(int)
     def get_ac_dl_values(self, ac_id):
-        i = self._ac_ids.index(ac_id)
-
-        self.conf.ac_info_list[i].ac.status = False
-        self.conf.ac_info_list[i].ac_status_changed.emit()
-
-        for msg_id in self.conf.ac_info_list[i].ac._settings_ids.values():
-            self.get_dl_value(ac_id, msg_id)
-            time.sleep(self._step)
+        self.request_dl_values(ac_id)
         self.log_reporter.log("INFO: DL_VALUEs requested -")
 
+    @Slot()
+    def get_all_dl_values(self):
+        for ac_id in self.registry.ac_ids:
+            self.request_dl_values(ac_id)
+        if len(self.registry):
+            self.log_reporter.log("INFO: DL_VALUEs requested to {:d} AC -".format(len(self.registry)))
+
+    # All the DL_VALUE requests of ac_id answered (or given up)
+    @Slot(int, bool)
+    def dl_values_done(self, ac_id, ok):
+        i = self.registry.slot(ac_id)
+        if i is not None:
+            self.conf.ac_info_list[i].status = True
+
     @Slot(int)
     def commit_settings(self, ac_id):
-        i = self._ac_ids.index(ac_id)
+        i = self.registry.slot(ac_id)
         index_ell_ke = self.conf.ac_info_list[i].ac._settings_ids["ell_ke"]
         index_ell_kn = self.conf.ac_info_list[i].ac._settings_ids["ell_kn"]
         ke = self.conf.ac_info_list[i].buffer["ke"]
@@ -362,76 +758,130 @@ class ACPanel(QObject):
             self.send_dl_setting(ac_id, index_ell_kn, kn)
         self.log_reporter.log("INFO: DL_SETTINGs commited -")
 
+    # Send the new radius commands (unchanged ones are suppressed by the deadband filter)
     @Slot()
     def commit_all_ac_rad(self):
-        for ac_id in self._ac_ids:
-            i = self._ac_ids.index(ac_id)
-            u = self.conf.u_list[i]
-            index_ell_a = self.conf.ac_info_list[i].ac._settings_ids["ell_a"]
-            index_ell_b = self.conf.ac_info_list[i].ac._settings_ids["ell_b"]
-            self.send_dl_setting(ac_id, index_ell_a, self.conf.radius + u)
-            self.send_dl_setting(ac_id, index_ell_b, self.conf.radius + u)
+        now = self.conf.clock()
+        self.conf.latency.delivered(now)
+        radius_cmd = self.conf.radius + self.conf.u_list
+        slots = self.conf.cmd_filter.select(radius_cmd, now, self.conf.fleet.ell)
+        for i in slots:
+            ac = self.conf.ac_info_list[i].ac
+            rad = radius_cmd[i]
+            self.send_dl_setting(ac.id, ac._settings_ids["ell_a"], rad, CONTROL)
+            self.send_dl_setting(ac.id, ac._settings_ids["ell_b"], rad, CONTROL)
+        self.conf.latency.sent(slots, self.conf.clock())
 
 
     #####################################################
     # IVY BUS callbacks                                 #
     #####################################################
 
+    # Record the outgoing msgs (outbound sender thread)
+    def msg_sent_cb(self, ac_id, msg):
+        if self.bus_metrics is not None:
+            self.bus_metrics.on_sent(ac_id, msg)
+        if msg.name == "DL_SETTING" and self.registry.setting_key(ac_id, int(msg['index'])) == "ell_a":
+            self.conf.latency.on_wire(self.registry.slot(ac_id), self.conf.clock())
+        recorder = self.recorder
+        if recorder is not None:
+            if msg.name == "DL_SETTING":
+                recorder.record(rec.DL_SETTING, ac_id, int(msg['index']), (float(msg['value']),))
+            elif msg.name == "GET_DL_SETTING":
+                recorder.record(rec.GET_DL_SETTING, ac_id, int(msg['index']))
+
     # Process the DL_VALUE PprzMsg
     def dl_values_cb(self, ac_id, msg):
-        if ac_id in self._ac_ids and msg.name == "DL_VALUE":
-            i = self._ac_ids.index(ac_id)
+        if msg.name != "DL_VALUE":
+            return
+        index, value = int(msg.get_field(0)), float(msg.get_field(1))
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(rec.DL_VALUE, ac_id, index, (value,))
+
+        i = self.registry.slot(ac_id)
+        if i is not None:
             ac = self.conf.ac_info_list[i].ac
 
-            msg_id = int(msg.get_field(0))
-            if msg_id in ac._settings_ids.values():
-                key = [k for k, v in ac._settings_ids.items() if v == msg_id]
-                ac._settings[key[0]] = float(msg.get_field(1))
-                self.conf.ac_info_list[i].ac_info_updated.emit()
-                
-                ac.status = True
-                self.conf.ac_info_list[i].ac_status_changed.emit()
+            key = self.registry.setting_key(ac_id, index)
+            if key is not None:
+                ac._settings[key] = value
+                self.coalescer.mark(self.conf.ac_info_list[i], "ac_info_updated")
+                self.dl_tracker.resolve(ac_id, index)
+
+    # Wake up the event-driven CCF step
+    def notify_fresh_position(self, i):
+        trigger = self.conf.fresh_trigger
+        if trigger is not None:
+            trigger.notify(i)
 
     # Process the NAVIGATION PprzMsg
     def navigation_cb(self, ac_id, msg):
-        if ac_id in self._ac_ids and msg.name == "NAVIGATION":
-            i = self._ac_ids.index(ac_id)
-            ac = self.conf.ac_info_list[i].ac
-
-            ac.XY[0] = float(msg.get_field(2))
-            ac.XY[1] = float(msg.get_field(3))
-
-            self.conf.ac_info_list[i].ac.time_last_nav = time.monotonic()
-            self.conf.ac_info_list[i].set_initialized_nav(True)
+        t = self.conf.clock()
+        if msg.name != "NAVIGATION":
+            return
+        x, y = float(msg.get_field(2)), float(msg.get_field(3))
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(rec.NAVIGATION, ac_id, -1, (x, y))
+
+        i = self.registry.slot(ac_id)
+        if i is not None:
+            fleet = self.conf.fleet
+            with fleet.writer:
+                fleet.XY[i] = x, y
+                fleet.time_last_nav[i] = t
+                fleet.nav_count[i] += 1
+            self.notify_fresh_position(i)
 
     # 
     def rotorcraft_fp_cb(self, ac_id, msg):
-        if ac_id in self._ac_ids and msg.name == "ROTORCRAFT_FP":
-            i = self._ac_ids.index(ac_id)
-            ac = self.conf.ac_info_list[i].ac
-            
-            ac.XY[0] = float(msg.get_field(0))/256
-            ac.XY[1] = float(msg.get_field(1))/256
-
-            self.conf.ac_info_list[i].ac.time_last_nav = time.monotonic()
-            self.conf.ac_info_list[i].set_initialized_nav(True)
+        t = self.conf.clock()
+        if msg.name != "ROTORCRAFT_FP":
+            return
+        east, north = float(msg.get_field(0)), float(msg.get_field(1))
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(rec.ROTORCRAFT_FP, ac_id, -1, (east, north))
+
+        i = self.registry.slot(ac_id)
+        if i is not None:
+            fleet = self.conf.fleet
+            x, y = east/256, north/256
+            with fleet.writer:
+                fleet.XY[i] = x, y
+                fleet.time_last_nav[i] = t
+                fleet.nav_count[i] += 1
+            self.notify_fresh_position(i)
 
     # Process the GVF PprzMsg
     def gvf_cb(self, ac_id, msg):
-        if ac_id in self._ac_ids and msg.name == "GVF":
-            if int(msg.get_field(1)) == 1: # ELLIPSE trajectory
-                i = self._ac_ids.index(ac_id)
+        if msg.name != "GVF":
+            return
+        traj, s = int(msg.get_field(1)), float(msg.get_field(2))
+        recorder = self.recorder
+        if recorder is not None:
+            param = [float(p) for p in msg.get_field(4)[:rec.N_VALUES - 2]]
+            recorder.record(rec.GVF, ac_id, -1, [traj, s] + param)
+
+        i = self.registry.slot(ac_id)
+        if i is not None:
+            if traj == 1: # ELLIPSE trajectory
                 ac = self.conf.ac_info_list[i].ac
+                fleet = self.conf.fleet
 
                 param = msg.get_field(4)
-                ac.XYc[0] = float(param[0])
-                ac.XYc[1] = float(param[1])
-                ac._settings["ell_a"] = float(param[2])
-                ac._settings["ell_b"] = float(param[3])
-                ac.s = float(msg.get_field(2))
-
-                self.conf.ac_info_list[i].ac.time_last_gvf = time.monotonic()
-                self.conf.ac_info_list[i].set_initialized_gvf(True)
+                xc, yc = float(param[0]), float(param[1])
+                ell_a, ell_b = float(param[2]), float(param[3])
+                with fleet.writer:
+                    fleet.XYc[i] = xc, yc
+                    fleet.ell[i] = ell_a, ell_b
+                    fleet.s[i] = s
+                    fleet.time_last_gvf[i] = self.conf.clock()
+                    fleet.gvf_count[i] += 1
+                ac._settings["ell_a"] = ell_a
+                ac._settings["ell_b"] = ell_b
+                self.coalescer.mark(self.conf.ac_info_list[i], "ac_info_updated")
 
 
             
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Scaling benchmarks of the CCF control path with synthetic fleets.
+
+No Ivy bus is needed: ACPanel is built on top of a fake interface that only
+counts the messages sent by the outbound scheduler, and neither pprzlink nor
+the Paparazzi python libs are required (the messages fall back to the local
+transport ones and the setting indexes are given). For every fleet size it
+reports time per call, memory allocated per call and messages sent per tick.
+Results can be saved as a baseline and later compared against it to catch
+regressions.
+
+    -> python3 bench_ccf.py -n 3,30,300,3000 -save baseline.json
+    -> python3 bench_ccf.py -n 3,30,300,3000 -compare baseline.json
+"""
+
+import sys
+import json
+import time
+import platform
+import tracemalloc
+import numpy as np
+
+from PySide6.QtCore import QCoreApplication
+
+import ccf_kernel
+from acpanel import ACPanel
+from info_ac import InfoAC
+from fleet_state import FleetState
+from fleet_registry import FleetRegistry
+from command_filter import RadiusCommandFilter
+from latency import LatencyTracker
+from formationcontrol import FormationControlWorker
+
+SETTINGS_IDS = {"ell_a": 0, "ell_b": 1, "ell_ke": 2, "ell_kn": 3}
+
+"""\
+Stand-in for IvyMessagesInterface: keeps the subscriptions and counts sends
+"""
+class FakeInterface:
+    def __init__(self):
+        self.subscriptions = []
+        self.sent = 0
+
+    def subscribe(self, callback, msg):
+        self.subscriptions.append((callback, msg))
+
+    def send(self, msg):
+        self.sent += 1
+
+    def shutdown(self):
+        pass
+
+# ACPanel with a synthetic chain formation of n aircraft
+def synthetic_panel(n, seed=0):
+    rng = np.random.default_rng(seed)
+    interface = FakeInterface()
+    panel = ACPanel(interface=interface)
+
+    ids = list(range(1, n + 1))
+    B = np.zeros((n, n - 1), dtype=int)
+    B[np.arange(n - 1), np.arange(n - 1)] = 1
+    B[np.arange(1, n), np.arange(n - 1)] = -1
+
+    panel._ac_ids = ids
+    panel._delta_list = list(rng.uniform(0, 360, n - 1))
+    panel.conf.B = B
+    panel.conf.incidence = ccf_kernel.SparseIncidence(B)
+    panel.conf.k = 10
+    panel.conf.radius = 80.
+    panel.conf.u_max = 16.
+
+    fleet = FleetState(n)
+    panel.conf.fleet = fleet
+    panel.conf.ac_info_list = [InfoAC(ac_id, panel.log_reporter, fleet, slot, SETTINGS_IDS)
+                               for slot, ac_id in enumerate(ids)]
+    panel.conf.cmd_filter = RadiusCommandFilter(n)
+    panel.conf.latency = LatencyTracker(n, ids)
+    panel.link_monitor.reset(fleet, panel.conf.ac_info_list)
+    panel.registry = FleetRegistry(ids)
+    for ac_id in ids:
+        panel.registry.register_settings(ac_id, SETTINGS_IDS)
+    panel.delta_info_init()
+
+    # Aircraft flying around their circles, with recent telemetry
+    phases = rng.uniform(-np.pi, np.pi, n)
+    fleet.XY[:] = 80. * np.column_stack((np.cos(phases), np.sin(phases)))
+    fleet.ell[:] = 80.
+    fleet.time_last_nav[:] = fleet.time_last_gvf[:] = time.monotonic()
+    fleet.valid_nav[:] = fleet.valid_gvf[:] = True
+
+    return panel, interface
+
+# Median time per call (s), calibrating the number of calls per repeat
+def time_call(fn, min_time=0.05, repeats=5):
+    fn()
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or number >= 1e6:
+            break
+        number *= 10
+
+    times = [dt / number]
+    for _ in range(repeats - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return float(np.median(times))
+
+# Peak traced memory (bytes) and allocated blocks of one call
+def alloc_call(fn):
+    fn()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(max(0, s.count_diff) for s in after.compare_to(before, "lineno"))
+    return int(peak), int(blocks)
+
+def bench_fleet(n):
+    panel, interface = synthetic_panel(n)
+    worker = FormationControlWorker(panel.conf, panel.log_reporter)
+    worker.t_ctrl = time.monotonic()
+    panel.conf.fleet.snapshot(worker.snap)
+
+    # Radius commands of every AC sent (deadband filter reset before each call) or all suppressed
+    def commit_all_ac_rad():
+        panel.conf.cmd_filter.last_sent.fill(np.nan)
+        panel.commit_all_ac_rad()
+
+    cases = {
+        "circular_formation": worker.circular_formation,
+        "link_health_check": panel.link_monitor.check,
+        "delta_info_init": panel.delta_info_init,
+        "commit_all_ac_rad": commit_all_ac_rad,
+        "commit_ac_rad_idle": panel.commit_all_ac_rad,
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        if name.startswith("commit_"):
+            worker.circular_formation()
+        if name == "commit_ac_rad_idle":
+            fn() # every radius already sent
+            panel.outbound.wait_idle(60.)
+        sent = interface.sent
+        fn()
+        panel.outbound.wait_idle(60.)
+        msgs = interface.sent - sent
+        peak, blocks = alloc_call(fn)
+        results[name] = {"time_us": time_call(fn) * 1e6, "alloc_bytes": peak, "alloc_blocks": blocks, "msgs": msgs}
+    return results
+
+def print_results(results, baseline=None, tolerance=0.25):
+    regressions = []
+    print("{:>6s} {:<20s} {:>12s} {:>12s} {:>8s} {:>6s}".format("n", "case", "time (us)", "alloc (B)", "blocks", "msgs"))
+    for n, cases in results.items():
+        for name, r in cases.items():
+            line = "{:>6s} {:<20s} {:>12.1f} {:>12d} {:>8d} {:>6d}".format(
+                n, name, r["time_us"], r["alloc_bytes"], r["alloc_blocks"], r["msgs"])
+            if baseline is not None and name in baseline.get(n, {}):
+                ref = baseline[n][name]
+                ratio = r["time_us"] / ref["time_us"]
+                line += "  x{:.2f}".format(ratio)
+                if ratio > 1 + tolerance or r["msgs"] > ref["msgs"]:
+                    line += "  REGRESSION"
+                    regressions.append((n, name))
+            print(line)
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CCF control path benchmarks")
+    parser.add_argument('-n', '--n', dest='sizes', default="3,30,300,3000", help="fleet sizes")
+    parser.add_argument('-save', '--save', dest='save', default=None, help="save the results as a baseline .json")
+    parser.add_argument('-compare', '--compare', dest='compare', default=None, help="baseline .json to compare against")
+    parser.add_argument('-tol', '--tol', dest='tolerance', type=float, default=0.25, help="allowed time increase (ratio)")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+
+    results = {}
+    for n in [int(n) for n in args.sizes.split(",")]:
+        results[str(n)] = bench_fleet(n)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)["results"]
+
+    regressions = print_results(results, baseline, args.tolerance)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump({"python": platform.python_version(), "numpy": np.__version__,
+                       "machine": platform.machine(), "results": results}, f, indent=2)
+        print("baseline saved to " + args.save)
+
+    if regressions:
+        sys.exit(1)
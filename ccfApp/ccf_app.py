@@ -33,6 +33,7 @@ from PySide6.QtCore import QCoreApplication
 from PySide6.QtGui import QGuiApplication, QIcon
 from PySide6.QtQml import QQmlApplicationEngine
 
+import acpanel
 from acpanel import ACPanel
 
 def gen_app(name):
@@ -53,5 +54,22 @@ def run_qml(app):
         
 # -- If executed as a program --
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CCF Control Panel")
+    parser.add_argument('-record', '--record', dest='record', action='store_true',
+                        help="record the telemetry (ccfApp/records/*.ccfrec) from the start")
+    parser.add_argument('-transport', '--transport', dest='transport', default=None,
+                        help="message transport: ivy, udp or local (CCF_TRANSPORT by default)")
+    parser.add_argument('-udp_links', '--udp_links', dest='udp_links', default=None,
+                        help="udp links ac_id:out_port:in_port,... (AC side ports, as in proxy_sim.py)")
+    parser.add_argument('-metrics', '--metrics', dest='metrics_port', type=int, default=None,
+                        help="serve Prometheus metrics on this local port (CCF_METRICS_PORT by default)")
+    args, _ = parser.parse_known_args()
+    acpanel.RECORD_ON_START = args.record
+    acpanel.TRANSPORT = args.transport
+    acpanel.UDP_LINKS = args.udp_links
+    acpanel.METRICS_PORT = args.metrics_port
+
     app = gen_app("CCF Control Panel")
     sys.exit(run_qml(app))
\ No newline at end of file
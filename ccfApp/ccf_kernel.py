@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#                    Hector Garcia de Marina <hgdemarina@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Array kernel of the Circular Formation Control algorithm.
+
+This module only depends on NumPy, so it can be shared by the Qt worker
+and by any headless tool (simulators, sweeps, benchmarks).
+"""
+
+import numpy as np
+
+"""\
+Edge-list (sparse) form of the incidence matrix B (agents x edges).
+Column e of B must hold exactly one +1 (head, "to") and one -1 (tail, "from").
+"""
+class SparseIncidence:
+    def __init__(self, B):
+        B = np.asarray(B)
+        if B.ndim != 2:
+            raise ValueError("topology must be a 2D (agents x edges) matrix")
+
+        self.n_agents, self.n_edges = B.shape
+
+        is_head, is_tail = (B == 1), (B == -1)
+        valid = (is_head.sum(axis=0) == 1) & (is_tail.sum(axis=0) == 1) & ((B != 0).sum(axis=0) == 2)
+        if not valid.all():
+            raise ValueError("topology column {:d} is not an incidence column".format(np.flatnonzero(~valid)[0]))
+
+        self.heads = is_head.argmax(axis=0)
+        self.tails = is_tail.argmax(axis=0)
+
+    # B^T x (one value per edge)
+    def edge_diff(self, x):
+        return x[self.heads] - x[self.tails]
+
+    # B y (one value per agent)
+    def node_sum(self, y):
+        return np.bincount(self.heads, y, self.n_agents) - np.bincount(self.tails, y, self.n_agents)
+
+
+# Wrap angles to (-pi, pi] (inputs are expected within (-3pi, 3pi])
+def wrap_to_pi(x):
+    return np.where(x > np.pi, x - 2*np.pi, np.where(x <= -np.pi, x + 2*np.pi, x))
+
+'''\
+Circular Formation Control law over the whole fleet.
+    XY, XYc       -> (N,2) positions and ellipse centers
+    s             -> GVF direction of the fleet
+    k, u_max      -> gain and saturation of the radius correction
+    incidence     -> SparseIncidence of the topology
+    delta_desired -> (E,) desired inter-vehicle angles in rad
+Returns the saturated radius corrections (N,) and the errors (E,) in rad.
+'''
+def circular_formation(XY, XYc, s, k, u_max, incidence, delta_desired):
+    sigma = np.arctan2(XY[:,1] - XYc[:,1], XY[:,0] - XYc[:,0])
+
+    error_sigma = wrap_to_pi(incidence.edge_diff(sigma) - delta_desired)
+
+    u = - s * k * incidence.node_sum(error_sigma)
+    return np.clip(u, -u_max, u_max), error_sigma
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import threading
+
+MIN_RATE_HZ = 0.5
+MAX_RATE_HZ = 50.
+
+# Longest single sleep, so a stop request is never delayed by a whole period
+MAX_SLEEP = 0.1
+
+def clamp_rate(rate_hz):
+    return min(max(float(rate_hz), MIN_RATE_HZ), MAX_RATE_HZ)
+
+"""\
+Per-tick timing statistics (all in seconds). The mean values are
+exponentially weighted, the max values are kept since the last reset.
+"""
+class TickStats:
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.timeouts = 0
+
+        self.period = 0.
+        self.jitter = 0.
+        self.compute = 0.
+        self.period_mean = 0.
+        self.jitter_mean = 0.
+        self.compute_mean = 0.
+        self.jitter_max = 0.
+        self.compute_max = 0.
+
+    def update(self, period, jitter, compute):
+        self.period, self.jitter, self.compute = period, jitter, compute
+        if self.ticks == 0:
+            self.period_mean, self.jitter_mean, self.compute_mean = period, jitter, compute
+        else:
+            a = self.alpha
+            self.period_mean += a * (period - self.period_mean)
+            self.jitter_mean += a * (jitter - self.jitter_mean)
+            self.compute_mean += a * (compute - self.compute_mean)
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.compute_max = max(self.compute_max, compute)
+        self.ticks += 1
+
+    def summary(self):
+        summary = "period {:.1f} ms, jitter {:.2f} ms (max {:.2f}), compute {:.2f} ms (max {:.2f}), " \
+                  "overruns {:d}, skipped {:d}".format(
+                      self.period_mean*1e3, self.jitter_mean*1e3, self.jitter_max*1e3,
+                      self.compute_mean*1e3, self.compute_max*1e3, self.overruns, self.skipped)
+        if self.timeouts:
+            summary += ", timeouts {:d}".format(self.timeouts)
+        return summary
+
+"""\
+Deadline-based periodic scheduler.
+
+Deadlines are placed on an absolute grid (t0 + n*T), so the compute time
+of each tick does not accumulate as drift. When a tick finishes after the
+next deadline it is counted as an overrun and the missed deadlines are
+skipped instead of being run back to back.
+"""
+class DeadlineScheduler:
+    def __init__(self, rate_hz=1., clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = TickStats()
+        self.set_rate(rate_hz)
+        self._next = None
+        self._last_tick = None
+        self._tick_start = None
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = clamp_rate(rate_hz)
+        self.period = 1. / self.rate_hz
+        # Re-anchor the grid at the next wait
+        self._next = None
+
+    def start(self):
+        self.stats.reset()
+        self._next = None
+        self._last_tick = None
+
+    # Sleep until the next deadline. Returns False if running() turned False meanwhile.
+    def wait(self, running=lambda: True):
+        if self._next is None:
+            self._next = self.clock()
+
+        remaining = self._next - self.clock()
+        while remaining > 0:
+            if not running():
+                return False
+            self.sleep(min(remaining, MAX_SLEEP))
+            remaining = self._next - self.clock()
+
+        self._tick_start = self.clock()
+        return running()
+
+    # Close the current tick: update stats and move to the next deadline
+    def tick_done(self):
+        now = self.clock()
+        start = self._tick_start
+
+        period = 0. if self._last_tick is None else start - self._last_tick
+        self.stats.update(period, start - self._next, now - start)
+        self._last_tick = start
+
+        self._next += self.period
+        if now > self._next:
+            missed = int((now - self._next) // self.period) + 1
+            self._next += missed * self.period
+            self.stats.overruns += 1
+            self.stats.skipped += missed
+            return missed
+        return 0
+
+"""\
+Tracks which aircraft have delivered a position since the last control step.
+notify() is called from the telemetry callbacks and is O(1).
+"""
+class FreshnessTrigger:
+    def __init__(self, n_ac):
+        self.n_ac = n_ac
+        self._cond = threading.Condition()
+        self._fresh = [False] * n_ac
+        self._count = 0
+
+    def notify(self, slot):
+        with self._cond:
+            if not self._fresh[slot]:
+                self._fresh[slot] = True
+                self._count += 1
+                if self._count == self.n_ac:
+                    self._cond.notify()
+
+    # Wait until every aircraft is fresh or the timeout expires. Returns True if all are fresh.
+    def wait(self, timeout):
+        with self._cond:
+            if self._count < self.n_ac and timeout > 0:
+                self._cond.wait(timeout)
+            return self._count == self.n_ac
+
+    # Start a new step: every aircraft becomes stale again
+    def clear(self):
+        with self._cond:
+            self._fresh = [False] * self.n_ac
+            self._count = 0
+
+"""\
+Event-driven scheduler: a tick starts as soon as every aircraft has reported
+a new position, or when max_wait (1/rate) runs out. Ticks are never closer
+than 1/MAX_RATE_HZ. It exposes the same interface as DeadlineScheduler.
+"""
+class EventScheduler:
+    def __init__(self, trigger, rate_hz=1., clock=time.monotonic, sleep=time.sleep):
+        self.trigger = trigger
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = TickStats()
+        self.min_period = 1. / MAX_RATE_HZ
+        self.set_rate(rate_hz)
+        self._last_tick = None
+        self._tick_start = None
+        self._ready = None
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = clamp_rate(rate_hz)
+        self.max_wait = 1. / self.rate_hz
+
+    def start(self):
+        self.stats.reset()
+        self._last_tick = None
+        self.trigger.clear()
+
+    def wait(self, running=lambda: True):
+        if self._last_tick is not None:
+            remaining = self._last_tick + self.min_period - self.clock()
+            if remaining > 0:
+                self.sleep(remaining)
+
+        start = self.clock() if self._last_tick is None else self._last_tick
+        deadline = start + self.max_wait
+        fresh = False
+        while running():
+            remaining = deadline - self.clock()
+            fresh = self.trigger.wait(min(remaining, MAX_SLEEP))
+            if fresh or remaining <= MAX_SLEEP:
+                break
+        else:
+            return False
+
+        self._ready = self.clock()
+        if not fresh:
+            self.stats.timeouts += 1
+        self.trigger.clear()
+        self._tick_start = self.clock()
+        return running()
+
+    def tick_done(self):
+        now = self.clock()
+        start = self._tick_start
+
+        period = 0. if self._last_tick is None else start - self._last_tick
+        self.stats.update(period, start - self._ready, now - start)
+        self._last_tick = start
+        return 0
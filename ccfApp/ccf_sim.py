@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#                    Hector Garcia de Marina <hgdemarina@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Headless fast-time simulator of the centralized circular formation (CCF).
+
+N unicycle agents with constant speed follow the GVF of their own ellipse
+(a circle of radius a = b), and every control period the radii are
+commanded by the same circular_formation law used by the CCF worker.
+No Qt or Ivy is needed.
+
+    -> python3 ccf_sim.py formation/sonic_three.json -t 300 -o sonic.npz
+"""
+
+import json
+import time
+import numpy as np
+
+from ccf_kernel import SparseIncidence, circular_formation
+
+"""\
+Formation parameters read from the formation/*.json files (same schema and
+defaults as ACPanel.read_json_file).
+"""
+class FormationConfig:
+    def __init__(self, ids, topology, delta_deg, k, radius, u_max=None, rate=1.):
+        self.ids = list(ids)
+        self.B = np.array(topology)
+        self.incidence = SparseIncidence(self.B)
+        self.delta_deg = np.array(delta_deg, dtype=float)
+        self.k = k
+        self.radius = radius
+        self.u_max = 0.2 * radius if u_max is None else u_max
+        self.rate = rate
+
+    @classmethod
+    def from_json(cls, json_path):
+        with open(json_path, 'r') as f:
+            config = json.load(f)
+        return cls(config['ids'], config['topology'], config['desired_intervehicle_angles_degrees'],
+                   config['gain'], config['desired_stationary_radius_meters'],
+                   rate=config.get('control_rate_hz', 1.))
+
+"""\
+Time series produced by CCFSim.run(), sampled at every control step.
+    t            -> (T,) time in seconds
+    error_sigma  -> (T,E) inter-vehicle errors in degrees
+    radius_cmd   -> (T,N) commanded radii (radius + u)
+    XY           -> (T,N,2) positions (only if requested)
+"""
+class SimResult:
+    def __init__(self, t, error_sigma, radius_cmd, XY=None):
+        self.t = t
+        self.error_sigma = error_sigma
+        self.radius_cmd = radius_cmd
+        self.XY = XY
+
+    def save(self, path):
+        arrays = {"t": self.t, "error_sigma": self.error_sigma, "radius_cmd": self.radius_cmd}
+        if self.XY is not None:
+            arrays["XY"] = self.XY
+        np.savez_compressed(path, **arrays)
+
+"""\
+Unicycle agents following the GVF ellipse
+    tau = s E n,  m_d = tau - ke e n,  omega = kn (angle(m_d) - theta)
+with e = (dx/a)^2 + (dy/b)^2 - 1 and n = grad(e).
+The controller sees the positions `delay` seconds late, and each position
+update is lost with probability `loss` (the last received one is kept).
+"""
+class CCFSim:
+    def __init__(self, conf, dt=0.01, speed=None, s=1, ke=1., kn=1., omega_max=None,
+                 phases0=None, center=(0., 0.), delay=0., loss=0., seed=None):
+        self.conf = conf
+        self.n = len(conf.ids)
+        self.dt = dt
+        self.s = s
+        self.ke = ke
+        self.kn = kn
+        self.omega_max = omega_max
+        self.loss = loss
+        self.delay_steps = int(round(delay / dt))
+
+        # Default cruise speed: 0.15 rad/s of angular speed on the nominal circle
+        speed = 0.15 * conf.radius if speed is None else speed
+        self.speed = np.broadcast_to(np.asarray(speed, dtype=float), (self.n,)).copy()
+
+        self.rng = np.random.default_rng(seed)
+        if phases0 is None:
+            phases0 = self.rng.uniform(-np.pi, np.pi, self.n)
+        self.reset(np.asarray(phases0, dtype=float), center)
+
+    # Agents start on the nominal circle, heading along the tangent given by s
+    def reset(self, phases0, center=(0., 0.)):
+        r = self.conf.radius
+        self.XYc = np.tile(np.asarray(center, dtype=float), (self.n, 1))
+        self.XY = self.XYc + r * np.column_stack((np.cos(phases0), np.sin(phases0)))
+        self.theta = phases0 - self.s * np.pi/2
+        self.ell_ab = np.full(self.n, float(r))
+        self.time = 0.
+        self.step = 0
+
+        # Position history for the telemetry delay and last received positions
+        self.XY_hist = np.repeat(self.XY[None], self.delay_steps + 1, axis=0)
+        self.XY_seen = self.XY.copy()
+
+    # Integrate the unicycles for one dt under the current ellipses
+    def integrate(self):
+        dX = self.XY - self.XYc
+        a2 = self.ell_ab**2
+        e = (dX[:,0]**2 + dX[:,1]**2) / a2 - 1
+        n = 2 * dX / a2[:,None]
+
+        # tau = s E n, with E = [[0, 1], [-1, 0]]
+        md_x = self.s * n[:,1] - self.ke * e * n[:,0]
+        md_y = -self.s * n[:,0] - self.ke * e * n[:,1]
+
+        err = np.arctan2(md_y, md_x) - self.theta
+        omega = self.kn * np.arctan2(np.sin(err), np.cos(err))
+        if self.omega_max is not None:
+            omega = np.clip(omega, -self.omega_max, self.omega_max)
+
+        self.XY[:,0] += self.speed * np.cos(self.theta) * self.dt
+        self.XY[:,1] += self.speed * np.sin(self.theta) * self.dt
+        self.theta += omega * self.dt
+        self.time += self.dt
+        self.step += 1
+        if self.delay_steps:
+            self.XY_hist[self.step % (self.delay_steps + 1)] = self.XY
+
+    # Telemetry received by the controller at this step
+    def receive(self):
+        if self.delay_steps:
+            XY = self.XY_hist[(self.step + 1) % (self.delay_steps + 1)]
+        else:
+            XY = self.XY
+        if self.loss > 0:
+            received = self.rng.random(self.n) >= self.loss
+            self.XY_seen[received] = XY[received]
+        else:
+            self.XY_seen[:] = XY
+        return self.XY_seen
+
+    # Run the closed loop for t_final seconds
+    def run(self, t_final, record_xy=False):
+        conf = self.conf
+        delta_desired = conf.delta_deg * np.pi/180
+        steps_per_ctrl = max(1, int(round(1. / (conf.rate * self.dt))))
+        n_ctrl = int(t_final * conf.rate)
+
+        t = np.zeros(n_ctrl)
+        error_sigma = np.zeros((n_ctrl, conf.incidence.n_edges))
+        radius_cmd = np.zeros((n_ctrl, self.n))
+        XY = np.zeros((n_ctrl, self.n, 2)) if record_xy else None
+
+        for i in range(n_ctrl):
+            u, error = circular_formation(self.receive(), self.XYc, self.s, conf.k, conf.u_max,
+                                          conf.incidence, delta_desired)
+            self.ell_ab = conf.radius + u
+
+            t[i] = self.time
+            error_sigma[i] = error*180/np.pi
+            radius_cmd[i] = self.ell_ab
+            if record_xy:
+                XY[i] = self.XY
+
+            for _ in range(steps_per_ctrl):
+                self.integrate()
+
+        return SimResult(t, error_sigma, radius_cmd, XY)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless fast-time CCF simulator")
+    parser.add_argument('json_file', help="formation .json file")
+    parser.add_argument('-t', '--t', dest='t_final', type=float, default=300, help="simulated time (s)")
+    parser.add_argument('-dt', '--dt', dest='dt', type=float, default=0.01, help="integration step (s)")
+    parser.add_argument('-v', '--v', dest='speed', type=float, default=None, help="agents speed (m/s)")
+    parser.add_argument('-s', '--s', dest='s', type=int, default=1, help="GVF direction (1 or -1)")
+    parser.add_argument('-delay', '--delay', dest='delay', type=float, default=0., help="telemetry delay (s)")
+    parser.add_argument('-loss', '--loss', dest='loss', type=float, default=0., help="telemetry loss probability")
+    parser.add_argument('-seed', '--seed', dest='seed', type=int, default=None, help="seed of the initial phases")
+    parser.add_argument('-xy', '--xy', dest='record_xy', action='store_true', help="also save the positions")
+    parser.add_argument('-o', '--o', dest='output', default=None, help="output .npz file")
+    args = parser.parse_args()
+
+    conf = FormationConfig.from_json(args.json_file)
+    sim = CCFSim(conf, dt=args.dt, speed=args.speed, s=args.s, delay=args.delay, loss=args.loss, seed=args.seed)
+
+    t0 = time.perf_counter()
+    result = sim.run(args.t_final, record_xy=args.record_xy)
+    elapsed = time.perf_counter() - t0
+
+    n_steps = int(round(args.t_final / args.dt))
+    print("{:d} agents, {:.0f} s simulated in {:.2f} s ({:.0f} steps/s)".format(
+        sim.n, args.t_final, elapsed, n_steps / elapsed))
+    print("final |error_sigma| (deg): " + ", ".join("{:.2f}".format(abs(e)) for e in result.error_sigma[-1]))
+
+    if args.output is not None:
+        result.save(args.output)
+        print("saved to " + args.output)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Monte Carlo / grid parameter sweep of the CCF over a formation .json file.
+
+Every case runs the ccf_sim closed loop with its own gain, u_max, initial
+phases (seed), telemetry delay and packet loss, and the cases are spread
+over a process pool. Parameters are given as comma-separated values (grid)
+or as min:max ranges (random sampling).
+
+    -> python3 ccf_sweep.py formation/sonic_three.json -k 5,10,15 -umax 10,20 -seeds 20 -o grid.npz
+    -> python3 ccf_sweep.py formation/sonic_three.json -random 10000 -k 1:30 -delay 0:2 -loss 0:0.5 -seed 1 -o mc.npz
+"""
+
+import os
+import time
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from ccf_sim import FormationConfig, CCFSim
+
+PARAMS = ("k", "u_max", "seed", "delay", "loss")
+METRICS = ("t_conv", "overshoot", "final_error")
+
+# Error metrics of one run (errors in deg)
+def formation_metrics(t, error_sigma, tol):
+    abs_err = np.abs(error_sigma).max(axis=1)
+
+    # Convergence time: first sample after which the error stays below tol
+    above = np.flatnonzero(abs_err >= tol)
+    if above.size == 0:
+        t_conv = t[0]
+    elif above[-1] + 1 < t.size:
+        t_conv = t[above[-1] + 1]
+    else:
+        t_conv = np.nan
+
+    # Overshoot: largest excursion past zero, opposite to the initial error
+    sign0 = np.sign(error_sigma[0])
+    overshoot = max(0., (-sign0 * error_sigma).max())
+
+    return t_conv, overshoot, abs_err[-1]
+
+# Worker entry point (must be picklable)
+def run_case(args):
+    json_conf, case, sim_opts, t_final, tol = args
+    k, u_max, seed, delay, loss = case
+
+    conf = FormationConfig(json_conf['ids'], json_conf['topology'], json_conf['delta_deg'],
+                           k, json_conf['radius'], u_max=u_max, rate=json_conf['rate'])
+    sim = CCFSim(conf, delay=delay, loss=loss, seed=int(seed), **sim_opts)
+    result = sim.run(t_final)
+    return formation_metrics(result.t, result.error_sigma, tol)
+
+# "a,b,c" -> grid values, "min:max" -> uniform range
+def parse_param(text):
+    if ":" in text:
+        lo, hi = text.split(":")
+        return (float(lo), float(hi))
+    return [float(v) for v in text.split(",")]
+
+def grid_cases(values):
+    return np.array(list(itertools.product(*(values[p] for p in PARAMS))), dtype=float)
+
+def random_cases(values, n, seed=None):
+    rng = np.random.default_rng(seed)
+    cols = []
+    for p in PARAMS:
+        v = values[p]
+        if p == "seed":
+            cols.append(rng.integers(0, 2**31, n))
+        elif isinstance(v, tuple):
+            cols.append(rng.uniform(v[0], v[1], n))
+        else:
+            cols.append(rng.choice(v, n))
+    return np.column_stack(cols)
+
+def run_sweep(conf, cases, t_final, tol=2., sim_opts=None, workers=None, chunksize=None):
+    json_conf = {"ids": conf.ids, "topology": conf.B.tolist(), "delta_deg": conf.delta_deg.tolist(),
+                 "radius": conf.radius, "rate": conf.rate}
+    sim_opts = {} if sim_opts is None else sim_opts
+    workers = os.cpu_count() if workers is None else workers
+    if chunksize is None:
+        chunksize = max(1, len(cases) // (8 * workers))
+
+    jobs = ((json_conf, tuple(case), sim_opts, t_final, tol) for case in cases)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        metrics = np.array(list(executor.map(run_case, jobs, chunksize=chunksize)), dtype=float)
+    return metrics.reshape(len(cases), len(METRICS))
+
+# Columnar output: one float32 array per parameter and metric (int64 for the seeds)
+def save_results(path, cases, metrics, **meta):
+    columns = {p: cases[:,i].astype(np.int64 if p == "seed" else np.float32) for i, p in enumerate(PARAMS)}
+    columns.update({m: metrics[:,i].astype(np.float32) for i, m in enumerate(METRICS)})
+    columns.update({k: np.asarray(v) for k, v in meta.items()})
+    np.savez_compressed(path, **columns)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep of the CCF")
+    parser.add_argument('json_file', help="formation .json file")
+    parser.add_argument('-k', '--k', dest='k', default=None, help="gains (grid: a,b,c | random: min:max)")
+    parser.add_argument('-umax', '--umax', dest='u_max', default=None, help="u_max values (default from json)")
+    parser.add_argument('-seeds', '--seeds', dest='seeds', type=int, default=10, help="initial phase seeds per grid point")
+    parser.add_argument('-delay', '--delay', dest='delay', default="0", help="telemetry delays (s)")
+    parser.add_argument('-loss', '--loss', dest='loss', default="0", help="telemetry loss probabilities")
+    parser.add_argument('-random', '--random', dest='n_random', type=int, default=None, help="number of random cases")
+    parser.add_argument('-seed', '--seed', dest='seed', type=int, default=None,
+                        help="seed of the random cases (drawn and stored in the output if not given)")
+    parser.add_argument('-t', '--t', dest='t_final', type=float, default=200, help="simulated time per case (s)")
+    parser.add_argument('-dt', '--dt', dest='dt', type=float, default=0.02, help="integration step (s)")
+    parser.add_argument('-tol', '--tol', dest='tol', type=float, default=2., help="convergence tolerance (deg)")
+    parser.add_argument('-j', '--j', dest='workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('-o', '--o', dest='output', default="sweep.npz", help="output .npz file")
+    args = parser.parse_args()
+
+    conf = FormationConfig.from_json(args.json_file)
+    values = {
+        "k": parse_param(args.k) if args.k is not None else [float(conf.k)],
+        "u_max": parse_param(args.u_max) if args.u_max is not None else [conf.u_max],
+        "seed": list(range(args.seeds)),
+        "delay": parse_param(args.delay),
+        "loss": parse_param(args.loss),
+    }
+
+    meta = {}
+    if args.n_random is not None:
+        seed = args.seed if args.seed is not None else int(np.random.SeedSequence().generate_state(1)[0])
+        cases = random_cases(values, args.n_random, seed)
+        meta["random_seed"] = seed # -seed to draw the same cases again
+    else:
+        if any(isinstance(v, tuple) for v in values.values()):
+            parser.error("min:max ranges are only allowed with -random")
+        cases = grid_cases(values)
+
+    print("{:d} cases on {:d} workers ...".format(len(cases), args.workers or os.cpu_count()))
+    t0 = time.perf_counter()
+    metrics = run_sweep(conf, cases, args.t_final, args.tol, {"dt": args.dt}, args.workers)
+    elapsed = time.perf_counter() - t0
+
+    save_results(args.output, cases, metrics, json_file=args.json_file, t_final=args.t_final, tol=args.tol, **meta)
+    converged = np.isfinite(metrics[:,0])
+    print("done in {:.1f} s, {:d}/{:d} converged -> {:s}".format(elapsed, converged.sum(), len(cases), args.output))
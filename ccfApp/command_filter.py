@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+MSGS_PER_CMD = 2 # a radius command is sent as two DL_SETTINGs (ell_a and ell_b)
+
+"""\
+Deadband filter of the radius commands (DL_SETTING ell_a/ell_b).
+
+It keeps the last sent radius of every aircraft and compares the last
+acknowledged one (GVF telemetry echoes ell_a and ell_b back). A new command
+is only sent when:
+    - nothing was sent yet,
+    - it differs from the last sent one by more than `deadband` (meters),
+    - the echoed ellipse still differs from the last sent one after
+      `ack_timeout` (lost msg),
+    - or the last send is older than `refresh` (periodic refresh).
+The sent/suppressed counters count DL_SETTING messages, not aircraft.
+"""
+class RadiusCommandFilter:
+    def __init__(self, n_ac, deadband=0.5, refresh=2., ack_timeout=1.):
+        self.deadband = deadband        # meters
+        self.refresh = refresh          # secconds
+        self.ack_timeout = ack_timeout  # secconds
+
+        self.last_sent = np.full(n_ac, np.nan)
+        self.t_sent = np.full(n_ac, -np.inf)
+        self.sent = 0
+        self.suppressed = 0
+
+    # Slots whose radius has to be sent at time `now` (acked: echoed (ell_a, ell_b) of every AC)
+    def select(self, radius_cmd, now, acked):
+        age = now - self.t_sent
+        # The echo confirms the last radius really sent (a stale echo of an older one does not)
+        unacked = np.any(np.abs(acked - self.last_sent[:,None]) > self.deadband, axis=1) # NaN -> False
+        unacked |= np.any(np.isnan(acked), axis=1)
+
+        send = np.isnan(self.last_sent) | (age > self.refresh)
+        send |= np.abs(radius_cmd - self.last_sent) > self.deadband
+        send |= unacked & (age > self.ack_timeout)
+
+        slots = np.flatnonzero(send)
+        self.last_sent[slots] = radius_cmd[slots]
+        self.t_sent[slots] = now
+        self.sent += MSGS_PER_CMD * slots.size
+        self.suppressed += MSGS_PER_CMD * (radius_cmd.size - slots.size)
+        return slots
+
+    def summary(self):
+        return "CMD {:d} msgs sent, {:d} suppressed".format(self.sent, self.suppressed)
@@ -18,6 +18,7 @@
 
 import QtQuick
 import QtQuick.Layouts
+import QtQuick.Controls
 
 Rectangle {
         id: box_aicrafts
@@ -171,6 +172,12 @@ Rectangle {
                             maxDigits: 5
                             buttonTextColor: (ACPanel.ccfstate) ? "darkgreen" : "black"
                         }
+
+                        Text {
+                            text: box.modelData.latency
+                            font.pointSize: 8
+                            color: "black"
+                        }
                     }
                     
                     RowLayout {
@@ -295,4 +302,16 @@ Rectangle {
 
             }
         }
+
+        // Fleet initialization progress (settings resolved in the background)
+        ProgressBar {
+            anchors.left: parent.left
+            anchors.right: parent.right
+            anchors.bottom: parent.bottom
+            anchors.margins: 6
+            height: 6
+
+            visible: ACPanel.init_busy
+            value: ACPanel.init_progress
+        }
     }
\ No newline at end of file
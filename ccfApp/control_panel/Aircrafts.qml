@@ -41,6 +41,7 @@ Rectangle {
             ACPanel.read_json_file()
             ACPanel.ac_info_init()
             ACPanel.delta_info_init()
+            ACPanel.get_all_dl_values()
         }
 
         onButtonLaunchClick: {
@@ -18,6 +18,7 @@
 
 import QtQuick
 import QtQuick.Layouts
+import QtQuick.Controls
 
 Item {
     Rectangle {
@@ -73,6 +74,52 @@ Item {
                 }
             }
         }
+
+        RowLayout {
+            id: ccfrateLayout
+            height: 30
+            anchors.top: ccfsetttingLayout.bottom
+            anchors.left: parent.left
+            anchors.right: parent.right
+            anchors.leftMargin: 10
+
+            EntrySetting {
+                id: rateSetting
+
+                paramText: "rate (Hz)"
+                textWidth: 50
+
+                decimals: 1
+                from: 0.5
+                to: 50
+                step: 0.5
+                value: ACPanel.ccf_rate
+
+                onSettingUpdate: {
+                    ACPanel.ccf_rate = rateSetting.value
+                }
+            }
+
+            CheckBox {
+                id: eventCheck
+                text: "event"
+                checked: ACPanel.ccf_event_mode
+
+                onToggled: {
+                    ACPanel.ccf_event_mode = eventCheck.checked
+                }
+            }
+
+            Text {
+                id: timingText
+                Layout.fillWidth: true
+
+                text: ACPanel.ccf_timing
+                font.pointSize: 7
+                color: "black"
+                wrapMode: Text.Wrap
+            }
+        }
         
 
         Rectangle {
@@ -80,7 +127,7 @@ Item {
             height: 2
             anchors.left: parent.left
             anchors.right: parent.right
-            anchors.top: ccfsetttingLayout.bottom
+            anchors.top: ccfrateLayout.bottom
             anchors.topMargin: 6
             anchors.leftMargin: 12
             anchors.bottomMargin: 6
@@ -32,6 +32,35 @@ Item {
         color: "black"
     }
 
+    ButtonAnim {
+        id: latencyButton
+        anchors.top: parent.top
+        anchors.left: colsole_text.right
+        anchors.leftMargin: 10
+
+        buttonWidth: 90
+        buttonHeight: 18
+        buttonText: "Dump latency"
+        buttonColor: "lightgray"
+        buttonTextColor: "black"
+
+        onButtonClick: {
+            ACPanel.dump_latency()
+        }
+    }
+
+    Text {
+        id: link_text
+        anchors.top: parent.top
+        anchors.right: parent.right
+        height: 20
+
+        font.pointSize: 10
+        text: ACPanel.link_health + " | " + ACPanel.cmd_stats + " | " + ACPanel.latency_stats + " | " + ACPanel.ui_stats
+        color: "black"
+        verticalAlignment: Text.AlignVCenter
+    }
+
     Rectangle {
         id: box_logview
         anchors.top: colsole_text.bottom
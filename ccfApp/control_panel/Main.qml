@@ -22,7 +22,7 @@ import QtQuick.Layouts
 Window {
     id: main
 
-    width: 755
+    width: 860
     height: 500
     visible: true
     title: "Centralized Circular Formation"
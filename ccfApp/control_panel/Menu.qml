@@ -99,6 +99,43 @@ Item {
         }
     }
 
+    ColumnLayout {
+        id: captureLayout
+
+        anchors.top: parent.top
+        anchors.right: launchButton.left
+        anchors.rightMargin: 10
+        spacing: 3
+
+        ButtonAnim {
+            id: recordButton
+
+            buttonWidth: 90
+            buttonHeight: (menuHeight - 3) / 2
+
+            buttonText: (ACPanel.recording) ? "Stop REC" : "Record"
+            buttonTextColor: (ACPanel.recording) ? "red" : "black"
+
+            onButtonClick: {
+                ACPanel.toggle_recording()
+            }
+        }
+
+        ButtonAnim {
+            id: profileButton
+
+            buttonWidth: 90
+            buttonHeight: (menuHeight - 3) / 2
+
+            buttonText: (ACPanel.profiling) ? "Stop profile" : "Profile"
+            buttonTextColor: (ACPanel.profiling) ? "red" : "black"
+
+            onButtonClick: {
+                ACPanel.toggle_profiling()
+            }
+        }
+    }
+
     FileDialog {
         id: fileDialog
         currentFolder: Qt.resolvedUrl(ACPanel.json_main_folder)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import threading
+from collections import deque
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+"""\
+Asynchronous GET_DL_SETTING -> DL_VALUE request tracker.
+
+request() only queues the (ac_id, index) requests; a QTimer in the GUI thread
+sends them pipelined under a bus rate limit (msgs/s), without waiting for the
+replies. resolve() is called from the DL_VALUE callback (any thread) and
+matches the reply with its pending request. Requests without reply after
+`timeout` are sent again up to `retries` times. Every aircraft reports its
+completion with ac_done(ac_id, ok) once all its requests are answered or
+given up (at once if it has nothing to request).
+"""
+class DLValueTracker(QObject):
+
+    ac_done = Signal(int, bool)
+
+    def __init__(self, send, log_reporter, rate=200., timeout=1., retries=3, period=0.02):
+        super().__init__()
+        self.send = send
+        self.log_reporter = log_reporter
+        self.rate = rate        # msgs/s
+        self.timeout = timeout  # seconds
+        self.retries = retries
+
+        self._lock = threading.Lock()
+        self._queue = deque()   # (ac_id, index) waiting to be sent
+        self._pending = {}      # (ac_id, index) -> t_sent
+        self._attempts = {}     # (ac_id, index) -> sends so far (kept across the retries)
+        self._left = {}         # ac_id -> requests not answered yet
+        self._failed = {}       # ac_id -> requests given up
+        self._answered = deque() # ac_id of the replies, consumed by the timer
+        self._tokens = 0.
+        self._t_last = None
+
+        self.sent = 0
+        self.replies = 0
+        self.retried = 0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(period * 1000))
+        self.timer.timeout.connect(self.process)
+
+    # Queue the requests of every index of ac_id (a running request of ac_id is restarted)
+    def request(self, ac_id, indexes):
+        indexes = [index for index in indexes if index is not None]
+        with self._lock:
+            self._cancel(ac_id)
+            if indexes:
+                for index in indexes:
+                    self._queue.append((ac_id, index))
+                self._left[ac_id] = len(indexes)
+                self._failed[ac_id] = 0
+            else:
+                self._left.pop(ac_id, None)
+                self._failed.pop(ac_id, None)
+        if not indexes:
+            self.ac_done.emit(ac_id, True) # nothing to wait for
+            return
+        if not self.timer.isActive():
+            self._t_last = None
+            self.timer.start()
+
+    def _cancel(self, ac_id):
+        if ac_id in self._left:
+            self._queue = deque(key for key in self._queue if key[0] != ac_id)
+            for key in [key for key in self._pending if key[0] == ac_id]:
+                del self._pending[key]
+            for key in [key for key in self._attempts if key[0] == ac_id]:
+                del self._attempts[key]
+
+    # Match a DL_VALUE reply. Returns False if nothing was waiting for it
+    def resolve(self, ac_id, index):
+        key = (ac_id, index)
+        with self._lock:
+            if self._pending.pop(key, None) is None:
+                try:
+                    self._queue.remove(key) # answered before being (re)sent
+                except ValueError:
+                    return False
+            self._attempts.pop(key, None)
+            self.replies += 1
+            self._left[ac_id] -= 1
+            self._answered.append(ac_id)
+        return True
+
+    def busy(self):
+        return bool(self._left)
+
+    # Send, retry and report completions (GUI thread)
+    def process(self):
+        now = time.monotonic()
+        dt = 0. if self._t_last is None else now - self._t_last
+        self._t_last = now
+        self._tokens = min(self._tokens + dt * self.rate, max(1., self.rate * self.timer.interval() / 1000.))
+        if dt == 0.:
+            self._tokens = max(self._tokens, 1.)
+
+        to_send = []
+        done = []
+        with self._lock:
+            # Timed out requests go back to the queue, or are given up
+            for key, t_sent in list(self._pending.items()):
+                if now - t_sent > self.timeout:
+                    del self._pending[key]
+                    if self._attempts[key] <= self.retries:
+                        self._queue.appendleft(key)
+                        self.retried += 1
+                    else:
+                        del self._attempts[key]
+                        self._left[key[0]] -= 1
+                        self._failed[key[0]] += 1
+                        self._answered.append(key[0])
+
+            while self._queue and self._tokens >= 1.:
+                key = self._queue.popleft()
+                self._pending[key] = now
+                self._attempts[key] = self._attempts.get(key, 0) + 1
+                self._tokens -= 1.
+                to_send.append(key)
+
+            while self._answered:
+                ac_id = self._answered.popleft()
+                if self._left.get(ac_id) == 0:
+                    done.append((ac_id, self._failed.pop(ac_id) == 0))
+                    del self._left[ac_id]
+
+            if not self._left:
+                self.timer.stop()
+
+        for ac_id, index in to_send:
+            self.send(ac_id, index)
+        self.sent += len(to_send)
+
+        for ac_id, ok in done:
+            if not ok:
+                self.log_reporter.log("WARNING: AC-{:03d} did not answer every GET_DL_SETTING -".format(ac_id))
+            self.ac_done.emit(ac_id, ok)
+
+    def summary(self):
+        return "DL {:d} sent, {:d} replies, {:d} retries".format(self.sent, self.replies, self.retried)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Closed-loop synthetic fleet emulator for stress tests.
+
+Hundreds of virtual aircraft (the CCFSim unicycles following their GVF
+circle) run on a single event loop and, like the real ones:
+    - publish NAVIGATION (fixedwing) or ROTORCRAFT_FP (rover/rotorcraft)
+      and GVF (ellipse) telemetry at configurable rates,
+    - follow the ell_a/ell_b changes of DL_SETTING (and datalink SETTING),
+    - answer GET_DL_SETTING (and datalink GET_SETTING) with DL_VALUE,
+using the setting indexes resolved by InfoAC.look_setting_ids (or the
+given ones when the Paparazzi settings can't be loaded).
+
+It talks through any transport: Ivy, to stress the app and the scripts as
+separate processes, UDP (aircraft side of the links), or a
+LocalBus/LocalInterface in the same process.
+
+    -> python3 fleet_emulator.py -n 300 -nav 4 -gvf 2
+    -> python3 fleet_emulator.py -n 2 -transport udp -udp_links 1:4244:4245,2:4246:4247
+    -> python3 fleet_emulator.py -json formation/three_aircraft.json -rotorcraft
+"""
+
+import time
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+from ccf_sim import CCFSim
+from transport import Message, open_interface
+import settings_cache
+
+SETTINGS_KEYS = ("ell_a", "ell_b", "ell_ke", "ell_kn")
+DEFAULT_SETTINGS_IDS = {"ell_a": 0, "ell_b": 1, "ell_ke": 2, "ell_kn": 3}
+
+# Setting indexes of ac_id, as resolved by InfoAC.look_setting_ids (default if not available)
+def resolve_settings_ids(ac_id, default=DEFAULT_SETTINGS_IDS):
+    try:
+        names = settings_cache.lookup(ac_id).names
+        return {key: names[key] for key in SETTINGS_KEYS}
+    except Exception:
+        return dict(default)
+
+def telemetry_msg(name, fields):
+    msg = Message("telemetry", name)
+    for field, value in fields:
+        msg[field] = value
+    return msg
+
+"""\
+Virtual fleet. The dynamics are integrated every dt for the whole fleet and
+every aircraft publishes on its own (randomly phased) schedule.
+"""
+class FleetEmulator:
+    def __init__(self, interface, ac_ids, radius=80., center=(0., 0.), speed=None, s=1,
+                 nav_rate=4., gvf_rate=2., rotorcraft=False, dt=0.02, settings_ids=None, seed=None):
+        self.interface = interface
+        self.ac_ids = list(ac_ids)
+        self.n = len(self.ac_ids)
+        self.slots = {ac_id: i for i, ac_id in enumerate(self.ac_ids)}
+        self.nav_period = 1. / nav_rate
+        self.gvf_period = 1. / gvf_rate
+        self.rotorcraft = rotorcraft
+        self.dt = dt
+
+        conf = SimpleNamespace(ids=self.ac_ids, radius=radius)
+        self.sim = CCFSim(conf, dt=dt, speed=speed, s=s, center=center, seed=seed)
+        self.ell = np.full((self.n, 2), float(radius))
+        self.s = s
+
+        # Setting indexes and values of every aircraft
+        with settings_cache.default_cache().batch():
+            self.settings_ids = [resolve_settings_ids(ac_id) if settings_ids is None else dict(settings_ids)
+                                 for ac_id in self.ac_ids]
+        self.settings = [{key: None for key in ids.values()} for ids in self.settings_ids]
+        for i in range(self.n):
+            self._set(i, self.settings_ids[i]["ell_a"], radius)
+            self._set(i, self.settings_ids[i]["ell_b"], radius)
+            self._set(i, self.settings_ids[i]["ell_ke"], self.sim.ke)
+            self._set(i, self.settings_ids[i]["ell_kn"], self.sim.kn)
+
+        rng = np.random.default_rng(seed)
+        self.next_nav = rng.uniform(0, self.nav_period, self.n)
+        self.next_gvf = rng.uniform(0, self.gvf_period, self.n)
+
+        self._inbox = deque()
+        self._running = False
+        self._thread = None
+
+        self.published = 0
+        self.received = 0
+        self.overruns = 0
+
+        self.interface.subscribe(self.setting_cb, Message("ground", "DL_SETTING"))
+        self.interface.subscribe(self.setting_cb, Message("datalink", "SETTING"))
+        self.interface.subscribe(self.get_setting_cb, Message("ground", "GET_DL_SETTING"))
+        self.interface.subscribe(self.get_setting_cb, Message("datalink", "GET_SETTING"))
+
+    def _set(self, i, index, value):
+        if index is None:
+            return
+        self.settings[i][index] = float(value)
+        ids = self.settings_ids[i]
+        if index == ids["ell_a"]:
+            self.ell[i, 0] = value
+        elif index == ids["ell_b"]:
+            self.ell[i, 1] = value
+
+    # ----- Bus callbacks (bus thread): only queue the requests for the event loop
+
+    def setting_cb(self, sender_id, msg):
+        if msg.name in ("DL_SETTING", "SETTING"):
+            self._inbox.append((msg.name, int(msg['ac_id']), int(msg['index']), float(msg['value'])))
+
+    def get_setting_cb(self, sender_id, msg):
+        if msg.name in ("GET_DL_SETTING", "GET_SETTING"):
+            self._inbox.append(("GET_DL_SETTING", int(msg['ac_id']), int(msg['index']), None))
+
+    # ----- Event loop
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name="fleet_emulator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self, duration=None):
+        t0 = time.perf_counter()
+        t = 0.
+        while self._running and (duration is None or t < duration):
+            self.step(t)
+            t += self.dt
+            delay = t0 + t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.overruns += 1
+
+    # Handle the received msgs, integrate one dt and publish the due telemetry
+    def step(self, t):
+        while self._inbox:
+            name, ac_id, index, value = self._inbox.popleft()
+            i = self.slots.get(ac_id)
+            if i is None:
+                continue
+            self.received += 1
+            if name == "GET_DL_SETTING":
+                value = self.settings[i].get(index)
+                if value is not None:
+                    self.publish(ac_id, telemetry_msg("DL_VALUE", (("index", index), ("value", value))))
+            else:
+                self._set(i, index, value)
+
+        # Circles of radius ell_a (ell_b is echoed back as commanded)
+        self.sim.ell_ab = self.ell[:, 0]
+        self.sim.integrate()
+
+        XY, XYc = self.sim.XY, self.sim.XYc
+        for i in np.flatnonzero(self.next_nav <= t):
+            self.publish_nav(i, XY[i])
+            self.next_nav[i] += self.nav_period
+        for i in np.flatnonzero(self.next_gvf <= t):
+            self.publish_gvf(i, XY[i], XYc[i])
+            self.next_gvf[i] += self.gvf_period
+
+    def publish(self, ac_id, msg):
+        self.interface.send(msg, ac_id)
+        self.published += 1
+
+    def publish_nav(self, i, xy):
+        x, y = float(xy[0]), float(xy[1])
+        if self.rotorcraft:
+            msg = telemetry_msg("ROTORCRAFT_FP", (("east", int(x * 256)), ("north", int(y * 256)), ("up", 0),
+                                                  ("veast", 0), ("vnorth", 0), ("vup", 0), ("phi", 0),
+                                                  ("theta", 0), ("psi", 0), ("carrot_east", 0),
+                                                  ("carrot_north", 0), ("carrot_up", 0), ("carrot_psi", 0),
+                                                  ("thrust", 0), ("flight_time", 0)))
+        else:
+            msg = telemetry_msg("NAVIGATION", (("cur_block", 0), ("cur_stage", 0), ("pos_x", x), ("pos_y", y),
+                                               ("dist_wp", 0.), ("dist_home", 0.), ("flight_time", 0),
+                                               ("circle_count", 0), ("oval_count", 0)))
+        self.publish(self.ac_ids[i], msg)
+
+    def publish_gvf(self, i, xy, xyc):
+        a, b = self.ell[i]
+        dx, dy = xy[0] - xyc[0], xy[1] - xyc[1]
+        error = (dx / a)**2 + (dy / b)**2 - 1
+        msg = telemetry_msg("GVF", (("error", float(error)), ("traj", 1), ("s", self.s),
+                                    ("ke", self.settings[i][self.settings_ids[i]["ell_ke"]]),
+                                    ("p", [float(xyc[0]), float(xyc[1]), float(a), float(b), 0.])))
+        self.publish(self.ac_ids[i], msg)
+
+    def summary(self):
+        return "{:d} AC, {:d} msgs published, {:d} received, {:d} loop overruns".format(
+            self.n, self.published, self.received, self.overruns)
+
+
+if __name__ == '__main__':
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Closed-loop synthetic fleet emulator")
+    parser.add_argument('-n', '--n', dest='n_ac', type=int, default=100, help="number of aircraft (ids 1..n)")
+    parser.add_argument('-json', '--json', dest='json', default=None, help="take the ids and radius of a formation .json")
+    parser.add_argument('-nav', '--nav', dest='nav_rate', type=float, default=4., help="NAV telemetry rate (Hz)")
+    parser.add_argument('-gvf', '--gvf', dest='gvf_rate', type=float, default=2., help="GVF telemetry rate (Hz)")
+    parser.add_argument('-rotorcraft', '--rotorcraft', dest='rotorcraft', action='store_true',
+                        help="publish ROTORCRAFT_FP instead of NAVIGATION")
+    parser.add_argument('-dt', '--dt', dest='dt', type=float, default=0.02, help="event loop period (s)")
+    parser.add_argument('-t', '--t', dest='duration', type=float, default=None, help="run time (s), forever by default")
+    parser.add_argument('-transport', '--transport', dest='transport', default=None, help="ivy, udp or local")
+    parser.add_argument('-udp_links', '--udp_links', dest='udp_links', default=None,
+                        help="udp links ac_id:out_port:in_port,... (AC side ports)")
+    args = parser.parse_args()
+
+    ac_ids, radius = list(range(1, args.n_ac + 1)), 80.
+    if args.json is not None:
+        with open(args.json, 'r') as f:
+            config = json.load(f)
+        ac_ids, radius = config['ids'], config['desired_stationary_radius_meters']
+
+    interface = open_interface("Fleet emulator", args.transport, udp_links=args.udp_links, aircraft=True)
+    emulator = FleetEmulator(interface, ac_ids, radius, nav_rate=args.nav_rate, gvf_rate=args.gvf_rate,
+                             rotorcraft=args.rotorcraft, dt=args.dt)
+    emulator._running = True
+    try:
+        emulator.run(args.duration)
+    except KeyboardInterrupt:
+        print("\n- Emulator killed by Keyboard Interruption -")
+    print(emulator.summary())
+    interface.shutdown()
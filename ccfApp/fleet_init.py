@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, QCoreApplication, Signal, Slot
+
+import settings_cache
+
+"""\
+Resolves the settings of a fleet in a worker pool, off the GUI thread.
+
+The lookups (settings XML parsing on cache misses) run in the pool and every
+result is delivered back on the GUI thread through `resolved(ac_info,
+result)`, as soon as it is ready; result is the SettingsLookup or the
+exception raised. Results of a fleet replaced by a newer start() are dropped.
+The settings cache file is written once, when the whole fleet is resolved.
+"""
+class FleetInitializer(QObject):
+
+    resolved = Signal(object, object)
+    progress_changed = Signal()
+
+    _done = Signal(int, object, object) # pool thread -> GUI thread (queued)
+
+    def __init__(self, resolve=settings_cache.lookup, workers=8):
+        super().__init__()
+        self.resolve = resolve
+        self.workers = workers
+        self.executor = None # created by start(), shut down by stop()
+        self.generation = 0
+        self.total = 0
+        self.done = 0
+        self._holding = False # default settings cache held until the fleet is resolved
+        self._done.connect(self._on_done)
+
+    @property
+    def busy(self):
+        return self.done < self.total
+
+    @property
+    def progress(self):
+        return 1. if self.total == 0 else self.done / self.total
+
+    def _hold_cache(self, hold):
+        if hold != self._holding:
+            self._holding = hold
+            if hold:
+                settings_cache.default_cache().hold()
+            else:
+                settings_cache.default_cache().release()
+
+    def start(self, ac_info_list):
+        self.generation += 1
+        self.total = len(ac_info_list)
+        self.done = 0
+        self._hold_cache(self.busy)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fleet_init")
+        for ac_info in ac_info_list:
+            self.executor.submit(self._resolve, self.generation, ac_info, ac_info.ac.id)
+        self.progress_changed.emit()
+
+    def stop(self):
+        self.generation += 1
+        self.total = self.done = 0
+        self._hold_cache(False)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    # Pool thread
+    def _resolve(self, generation, ac_info, ac_id):
+        if generation != self.generation:
+            return
+        try:
+            result = self.resolve(ac_id)
+        except Exception as e:
+            result = e
+        self._done.emit(generation, ac_info, result)
+
+    @Slot(int, object, object)
+    def _on_done(self, generation, ac_info, result):
+        if generation != self.generation:
+            return
+        self.done += 1
+        if not self.busy:
+            self._hold_cache(False)
+        self.resolved.emit(ac_info, result)
+        self.progress_changed.emit()
+
+    # Process the results until the whole fleet is resolved (scripts without a running event loop)
+    def wait(self, timeout=None):
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while self.busy:
+            if t_end is not None and time.monotonic() > t_end:
+                return False
+            QCoreApplication.processEvents()
+            time.sleep(0.001)
+        return True
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Precomputed lookup tables of the loaded fleet, so that every Ivy message is
+dispatched in O(1) whatever the number of aircraft and settings:
+    ac_id              -> slot (row in FleetState / ac_info_list)
+    (ac_id, index)     -> setting key ("ell_a", "ell_b", ...)
+"""
+class FleetRegistry:
+    def __init__(self, ac_ids=()):
+        self.ac_ids = list(ac_ids)
+        self.slots = {ac_id: slot for slot, ac_id in enumerate(self.ac_ids)}
+        self.setting_keys = {}
+
+    def __len__(self):
+        return len(self.ac_ids)
+
+    def __contains__(self, ac_id):
+        return ac_id in self.slots
+
+    # Slot of ac_id, or None if it is not part of the fleet
+    def slot(self, ac_id):
+        return self.slots.get(ac_id)
+
+    # Register the resolved {key: index} settings of one aircraft
+    def register_settings(self, ac_id, settings_ids):
+        for key, index in settings_ids.items():
+            if index is not None:
+                self.setting_keys[(ac_id, index)] = key
+
+    # Setting key of (ac_id, index), or None if it is not tracked
+    def setting_key(self, ac_id, index):
+        return self.setting_keys.get((ac_id, index))
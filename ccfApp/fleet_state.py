@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import threading
+import numpy as np
+
+# Seqlock retries before the reader falls back to taking the writer lock
+SNAPSHOT_RETRIES = 100
+
+FIELDS = ("XY", "XYc", "ell", "s", "time_last_nav", "time_last_gvf", "nav_count", "gvf_count",
+          "valid_nav", "valid_gvf")
+
+"""\
+Struct-of-arrays state of the whole fleet (one row/slot per aircraft).
+
+The Ivy callbacks write into these arrays in place and the CCF worker reads
+them directly, without rebuilding per-aircraft arrays on every tick.
+Timestamps are time.monotonic() values, NaN until the first message.
+
+Writers wrap each update in `with fleet.writer:` (a seqlock: the sequence
+number is odd while a write is in progress). Readers on other threads take
+a consistent copy with snapshot() without ever blocking the writers.
+"""
+class FleetState:
+    def __init__(self, n_ac):
+        self.n_ac = n_ac
+
+        self.XY = np.zeros((n_ac, 2))               # NAV position
+        self.XYc = np.zeros((n_ac, 2))              # GVF ellipse center
+        self.ell = np.full((n_ac, 2), np.nan)       # GVF ellipse (a, b)
+        self.s = np.ones(n_ac)                      # GVF direction
+
+        self.time_last_nav = np.full(n_ac, np.nan)
+        self.time_last_gvf = np.full(n_ac, np.nan)
+        self.nav_count = np.zeros(n_ac, dtype=np.int64)
+        self.gvf_count = np.zeros(n_ac, dtype=np.int64)
+        self.valid_nav = np.zeros(n_ac, dtype=bool)
+        self.valid_gvf = np.zeros(n_ac, dtype=bool)
+
+        self.seq = 0
+        self._write_lock = threading.Lock()
+        self.writer = FleetWriter(self)
+
+    # Copy a consistent state into `out` (a FleetSnapshot, reused between calls)
+    def snapshot(self, out=None):
+        if out is None:
+            out = FleetSnapshot(self.n_ac)
+
+        for _ in range(SNAPSHOT_RETRIES):
+            seq = self.seq
+            if seq & 1:
+                time.sleep(0) # let the writer finish
+                continue
+            out.copy_from(self)
+            if self.seq == seq:
+                out.seq = seq
+                return out
+
+        # Writers are too busy: take the lock for a single copy
+        with self._write_lock:
+            out.copy_from(self)
+            out.seq = self.seq
+        return out
+
+class FleetWriter:
+    def __init__(self, fleet):
+        self.fleet = fleet
+
+    def __enter__(self):
+        self.fleet._write_lock.acquire()
+        self.fleet.seq += 1
+
+    def __exit__(self, *exc):
+        self.fleet.seq += 1
+        self.fleet._write_lock.release()
+
+"""\
+Preallocated copy of the FleetState arrays taken at a single instant
+"""
+class FleetSnapshot:
+    def __init__(self, n_ac):
+        self.n_ac = n_ac
+        self.seq = -1
+        self.XY = np.zeros((n_ac, 2))
+        self.XYc = np.zeros((n_ac, 2))
+        self.ell = np.full((n_ac, 2), np.nan)
+        self.s = np.ones(n_ac)
+        self.time_last_nav = np.full(n_ac, np.nan)
+        self.time_last_gvf = np.full(n_ac, np.nan)
+        self.nav_count = np.zeros(n_ac, dtype=np.int64)
+        self.gvf_count = np.zeros(n_ac, dtype=np.int64)
+        self.valid_nav = np.zeros(n_ac, dtype=bool)
+        self.valid_gvf = np.zeros(n_ac, dtype=bool)
+
+    def copy_from(self, fleet):
+        for field in FIELDS:
+            np.copyto(getattr(self, field), getattr(fleet, field))
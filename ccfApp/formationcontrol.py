@@ -21,98 +21,99 @@
 
 import numpy as np
 import time
+import threading
 
 from PySide6.QtCore import QObject, Signal
 
-def wrap(x):
-    return (x)
+import ccf_kernel
+from fleet_state import FleetSnapshot
+from predictor import PhasePredictor
+from ccf_scheduler import DeadlineScheduler, EventScheduler
+
 class FormationControlWorker(QObject):
 
     progress = Signal()
     finished = Signal()
+    timing_updated = Signal(str)
 
     def __init__(self, conf, log_reporter):
         super().__init__()
         self.conf = conf
         self.log_reporter = log_reporter
-        self.msg_timeout = 4 # secconds
+
+        # Consistent copy of the fleet state, refreshed at the start of every tick
+        self.snap = FleetSnapshot(self.conf.fleet.n_ac)
+        self.predictor = PhasePredictor(self.conf.fleet.n_ac)
+        self.t_ctrl = None
+        self.thread_ident = None # of the QThread running the loop (named in the profiles)
+
+        if self.conf.event_mode:
+            self.scheduler = EventScheduler(self.conf.fresh_trigger, self.conf.rate)
+        else:
+            self.scheduler = DeadlineScheduler(self.conf.rate)
+        self.timing_report_period = 1   # secconds
+        self.overrun_log_period = 5     # secconds
 
     # Main LOOP!!
     def run(self):
-        while self.conf.ccfstate:
-            self.circular_formation()
-            self.progress.emit()
-            self.check_last_msgs_time()
-            time.sleep(1)
-
+        self.thread_ident = threading.get_ident()
+        scheduler = self.scheduler
+        scheduler.start()
+        t_report = t_overrun_log = time.monotonic()
+
+        while scheduler.wait(lambda: self.conf.ccfstate):
+            self.step()
+
+            missed = scheduler.tick_done()
+            now = time.monotonic()
+            if missed and now - t_overrun_log > self.overrun_log_period:
+                t_overrun_log = now
+                self.log_reporter.log("WARNING: CCF tick overrun at {:.1f} Hz, {:d} ticks skipped so far -".format(
+                    scheduler.rate_hz, scheduler.stats.skipped))
+            if now - t_report > self.timing_report_period:
+                t_report = now
+                self.timing_updated.emit(scheduler.stats.summary())
+
+            # Rate changed from the panel
+            if self.conf.rate != scheduler.rate_hz:
+                scheduler.set_rate(self.conf.rate)
+
+        self.log_reporter.log("INFO: CCF timing - " + scheduler.stats.summary() + " -")
+        self.log_reporter.log("INFO: CCF latency (p50/p95/p99) - " + self.conf.latency.summary() + " -")
         self.log_reporter.log("INFO: CCF thread stopped -")
         self.finished.emit()
 
-    # Check for PprzMsg timeout and inform to the user
-    def check_last_msgs_time(self):
-        for ac_info in self.conf.ac_info_list:
-            dt_nav = time.monotonic() - ac_info.ac.time_last_nav
-            dt_gvf = time.monotonic() - ac_info.ac.time_last_gvf
-            if dt_nav > self.msg_timeout:
-                if ac_info.ac.initialized_nav:
-                    ac_info.set_initialized_nav(False)
-                    self.log_reporter.log("WARNING: NAV message timeout in AC-{:s} -".format(ac_info.idLabel))
-            if dt_gvf > self.msg_timeout:
-                if ac_info.ac.initialized_gvf:
-                    ac_info.set_initialized_gvf(False)
-                    self.log_reporter.log("WARNING: GVF message timeout in AC-{:s} -".format(ac_info.idLabel))
+    # One control tick
+    def step(self):
+        self.t_ctrl = self.conf.clock()
+        self.conf.fleet.snapshot(self.snap)
+        t_snap = self.conf.clock()
+        self.predictor.update(self.snap)
+        self.circular_formation()
+        self.conf.latency.tick(self.snap.time_last_nav, t_snap, self.conf.clock())
+        self.progress.emit()
 
     '''\
     Circular Formation Control algorithm
     '''
     def circular_formation(self):
-        ac_info_list = self.conf.ac_info_list
+        fleet = self.snap
         delta_info_list = self.conf.delta_info_list
-        sigma_list = np.zeros(len(self.conf.ac_info_list))
-
-        # Compute the inter-vehicle errors
-        i = 0
-        for ac_info in ac_info_list:
-            ac = ac_info.ac
-
-            # Compute the inter-vehicle errors
-            sigma_list[i] =  np.arctan2(ac.XY[1]-ac.XYc[1], ac.XY[0]-ac.XYc[0])
-            
-            i = i + 1
-
-        # Build delta_desired vector
-        delta_desired = np.zeros(len(delta_info_list))
-        
-        i = 0
-        for delta_info in delta_info_list:
-            delta_desired[i] = delta_info.value * np.pi/180
-
-            i = i + 1
-
-        inter_sigma = self.conf.B.transpose().dot(sigma_list)
-        error_sigma = inter_sigma - delta_desired
-
-        if np.size(error_sigma) > 1:
-            for i in range(0, np.size(error_sigma)):
-                if error_sigma[i] > np.pi:
-                    error_sigma[i] = error_sigma[i] - 2*np.pi
-                elif error_sigma[i] <= -np.pi:
-                    error_sigma[i] = error_sigma[i] + 2*np.pi
-        else:
-            if error_sigma > np.pi:
-                error_sigma = error_sigma - 2*np.pi
-            elif error_sigma <= -np.pi:
-                error_sigma = error_sigma + 2*np.pi
 
-        u = - ac_info_list[0].ac.s * self.conf.k *  self.conf.B.dot(error_sigma)
+        # Desired inter-vehicle angles
+        delta_desired = np.array([delta_info.value for delta_info in delta_info_list], dtype=float) * np.pi/180
 
-        # Return
-        self.conf.u_list = np.clip(u, -self.conf.u_max, self.conf.u_max)
+        # Optionally compensate the telemetry latency up to the control time
+        if self.conf.predict:
+            XY = self.predictor.predict(fleet, self.t_ctrl)
+        else:
+            XY = fleet.XY
 
-        i = 0
-        for delta_info in delta_info_list:
-            delta_info._error = error_sigma[i]*180/np.pi
-            delta_info.error_updated.emit()
-            i = i + 1
+        self.conf.u_list, error_sigma = ccf_kernel.circular_formation(
+            XY, fleet.XYc, fleet.s[0], self.conf.k, self.conf.u_max, self.conf.incidence, delta_desired)
 
-        
+        error_deg = error_sigma*180/np.pi
+        coalescer = self.conf.coalescer
+        for delta_info, error in zip(delta_info_list, error_deg):
+            delta_info._error = error
+            coalescer.mark(delta_info, "error_updated")
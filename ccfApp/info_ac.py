@@ -18,43 +18,83 @@
 # along with paparazzi; see the file COPYING.  If not, see
 # <http://www.gnu.org/licenses/>.
 
-import sys
 import numpy as np
-from os import path, getenv
 
 from PySide6.QtCore import QObject, Property, Signal, Slot
 
-# --- PprzLink
-PPRZ_HOME = getenv("PAPARAZZI_HOME", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
-PPRZ_SRC = getenv("PAPARAZZI_SRC", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
-sys.path.append(PPRZ_HOME + "/var/lib/python/")
-sys.path.append(PPRZ_SRC + "/sw/lib/python")
+from fleet_state import FleetState
 
-from settings_xml_parse import PaparazziACSettings
-from pprzlink.message import PprzMessage
+# --- Settings lookups (Paparazzi python libs, cached)
+import settings_cache
 # ---
 
+"""\
+Per-aircraft view onto its slot of the FleetState arrays
+"""
 class AC:
-    def __init__(self, ac_id):
+    def __init__(self, ac_id, fleet, slot):
         self.id = ac_id
+        self.fleet = fleet
+        self.slot = slot
         self.status = True
-
-        self.XY = np.zeros(2)
-        self.XYc = np.zeros(2)
-        self.s = 1
         self.error = None
-
-        self.initialized_gvf = False
-        self.initialized_nav = False
         self.info_checked = False
 
         # Setting to be modified
         self._settings_ids = {"ell_a":None, "ell_b":None, "ell_ke":None, "ell_kn":None}
         self._settings = {"ell_a":None, "ell_b":None, "ell_ke":None, "ell_kn":None}
 
-        # System time of last received messages
-        self.time_last_nav = None
-        self.time_last_gvf = None
+    # Row views (writing ac.XY[0] writes into the fleet table)
+    @property
+    def XY(self):
+        return self.fleet.XY[self.slot]
+
+    @property
+    def XYc(self):
+        return self.fleet.XYc[self.slot]
+
+    @property
+    def s(self):
+        return self.fleet.s[self.slot]
+
+    @s.setter
+    def s(self, value):
+        self.fleet.s[self.slot] = value
+
+    @property
+    def initialized_nav(self):
+        return bool(self.fleet.valid_nav[self.slot])
+
+    @initialized_nav.setter
+    def initialized_nav(self, value):
+        self.fleet.valid_nav[self.slot] = value
+
+    @property
+    def initialized_gvf(self):
+        return bool(self.fleet.valid_gvf[self.slot])
+
+    @initialized_gvf.setter
+    def initialized_gvf(self, value):
+        self.fleet.valid_gvf[self.slot] = value
+
+    # System time of last received messages (None if never received)
+    @property
+    def time_last_nav(self):
+        t = self.fleet.time_last_nav[self.slot]
+        return None if np.isnan(t) else float(t)
+
+    @time_last_nav.setter
+    def time_last_nav(self, value):
+        self.fleet.time_last_nav[self.slot] = np.nan if value is None else value
+
+    @property
+    def time_last_gvf(self):
+        t = self.fleet.time_last_gvf[self.slot]
+        return None if np.isnan(t) else float(t)
+
+    @time_last_gvf.setter
+    def time_last_gvf(self, value):
+        self.fleet.time_last_gvf[self.slot] = np.nan if value is None else value
 
 class InfoAC(QObject):
 
@@ -66,22 +106,36 @@ class InfoAC(QObject):
     ac_nav_state_changed = Signal()
     ac_gvf_state_changed = Signal()
     ac_check_changed = Signal()
+    ac_latency_updated = Signal()
 
-    def __init__(self, ac_id, log_reporter) -> None:
+    def __init__(self, ac_id, log_reporter, fleet=None, slot=0, settings_ids=None, lookup=True) -> None:
         super().__init__()
-        self.ac = AC(ac_id)
+        if fleet is None:
+            fleet = FleetState(1)
+        self.ac = AC(ac_id, fleet, slot)
         self.buffer = {"ke":None, "kn":None}
         self.log_reporter = log_reporter
-        
-        self.look_setting_ids()
+        self._latency = "age -" # telemetry -> radius command p50/p95/p99
 
+        # Known setting indexes (e.g. synthetic fleets) skip the settings XML lookup,
+        # which can also be left to the caller (ACPanel resolves the fleet in a worker pool)
+        if settings_ids is not None:
+            self.ac._settings_ids.update(settings_ids)
+        elif lookup:
+            self.look_setting_ids()
+        else:
+            self.ac.status = False # until its settings are resolved
+
+    # Flag setters only notify on real state changes
     def set_initialized_nav(self, state):
-        self.ac.initialized_nav = state
-        self.ac_nav_state_changed.emit()
+        if self.ac.initialized_nav != state:
+            self.ac.initialized_nav = state
+            self.ac_nav_state_changed.emit()
 
     def set_initialized_gvf(self, state):
-        self.ac.initialized_gvf = state
-        self.ac_gvf_state_changed.emit()
+        if self.ac.initialized_gvf != state:
+            self.ac.initialized_gvf = state
+            self.ac_gvf_state_changed.emit()
 
     # ----- AC Info properties
 
@@ -125,6 +179,10 @@ class InfoAC(QObject):
     def info_checked(self):
         return self.ac.info_checked
 
+    @Property(str, notify=ac_latency_updated)
+    def latency(self):
+        return self._latency
+
     # Settings...
     @Property(float, notify=ac_info_updated)
     def ke(self):
@@ -158,28 +216,39 @@ class InfoAC(QObject):
     # Get settings idexes
     Slot()
     def look_setting_ids(self):
-        settings = PaparazziACSettings(self.ac.id)
+        try:
+            settings = settings_cache.lookup(self.ac.id)
+        except Exception as e:
+            self.settings_lookup_failed(e)
+            return
+        self.apply_setting_ids(settings)
+
+    def settings_lookup_failed(self, e):
+        self.log_reporter.log("ERROR: AC-" + self.idLabel + " settings can not be looked up ({:s}). ".format(str(e)) + \
+                              "Set 'settings_ids' in the .json file -")
 
+    # Take the setting indexes from a settings_cache.SettingsLookup (True if all were found)
+    def apply_setting_ids(self, settings):
         # Check if both GVF and GVF_IK groups are loaded (which can cause conflicts)
         for group in settings.groups:
-            if group.name == "GVF_IK":
+            if group == "GVF_IK":
                 self.log_reporter.log(
                     f"ERROR: AC-{self.idLabel} GVF and GVF_IK are loaded at the same time, "
                     "which may lead to errors since they share setting names."
                 )
-                return    
+                return False
             # TODO: Support nested groups in settings_xml_parse.py to differentiate
             # between modules with the same setting names (e.g., GVF and GVF_IK).
 
         for setting_key in self.ac._settings_ids.keys():
                 try:
-                    index = settings.name_lookup[setting_key].index
+                    index = settings.names[setting_key]
                     if setting_key in ('ell_a', 'ell_b', 'ell_ke', 'ell_kn'):
                         self.ac._settings_ids[setting_key] = index
-                except Exception as e:
-                    print(e)
+                except KeyError:
                     self.log_reporter.log("ERROR: AC-" + self.idLabel + " reported " + setting_key + \
                                           " setting not found. Have you forgotten to check gvf.xml for your settings? -")
+        return None not in self.ac._settings_ids.values()
     
     # Try to change de info checked flag
     @Slot()
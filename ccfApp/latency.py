@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+End-to-end latency of the control path, from telemetry receipt to command.
+
+Every stage is measured as the age of the position used by the CCF, i.e.
+the time since its NAVIGATION/ROTORCRAFT_FP callback was entered:
+    snapshot - FormationControlWorker took the fleet snapshot
+    ccf      - circular_formation done
+    gui      - progress signal delivered to commit_all_ac_rad (GUI thread)
+    send     - send_dl_setting returned (radius command queued)
+    wire     - radius command handed to the transport by the outbound sender
+
+The two dumps of a run before and after a change can be compared with:
+
+    -> python3 latency.py records/latency_before.json records/latency_after.json
+"""
+
+import json
+import threading
+import numpy as np
+
+STAGES = ("snapshot", "ccf", "gui", "send", "wire")
+SNAPSHOT, CCF, GUI, SEND, WIRE = range(len(STAGES))
+PERCENTILES = (50, 95, 99)
+
+# Log-spaced histogram bins (seconds): 40 per decade from 0.1 ms to 100 s
+BIN_EDGES = np.logspace(-4, 2, 6 * 40 + 1)
+
+"""\
+Per-aircraft, per-stage latency histograms.
+
+The CCF worker, the GUI thread and the outbound sender thread all report
+into it, so every update is taken under a single lock. The histograms have
+fixed bins, so the memory and the cost of a percentile don't grow with
+the run time.
+"""
+class LatencyTracker:
+    def __init__(self, n_ac, ac_ids=None):
+        self.n_ac = n_ac
+        self.ac_ids = list(range(n_ac)) if ac_ids is None else list(ac_ids)
+        self._lock = threading.Lock()
+        self.counts = np.zeros((len(STAGES), n_ac, len(BIN_EDGES) + 1), dtype=np.int64)
+
+        # Receipt time of the positions used by the last tick, and of the queued commands
+        self._t_rx = np.full(n_ac, np.nan)
+        self._t_queued = np.full(n_ac, np.nan)
+
+    def reset(self):
+        with self._lock:
+            self.counts[:] = 0
+
+    def _add(self, stage, slots, ages):
+        self.counts[stage, slots, np.searchsorted(BIN_EDGES, ages)] += 1
+
+    # ----- Control path stages
+
+    # CCF tick (worker thread): receipt times of the snapshot positions
+    def tick(self, t_rx, t_snap, t_ccf):
+        slots = np.flatnonzero(~np.isnan(t_rx))
+        rx = t_rx[slots]
+        with self._lock:
+            self._add(SNAPSHOT, slots, t_snap - rx)
+            self._add(CCF, slots, t_ccf - rx)
+            self._t_rx[:] = t_rx
+
+    # progress signal delivered (GUI thread)
+    def delivered(self, t):
+        with self._lock:
+            slots = np.flatnonzero(~np.isnan(self._t_rx))
+            self._add(GUI, slots, t - self._t_rx[slots])
+
+    # Radius commands of `slots` queued (GUI thread)
+    def sent(self, slots, t):
+        with self._lock:
+            slots = [i for i in slots if not np.isnan(self._t_rx[i])]
+            self._add(SEND, slots, t - self._t_rx[slots])
+            self._t_queued[slots] = self._t_rx[slots]
+
+    # Radius command of `slot` handed to the transport (outbound thread)
+    def on_wire(self, slot, t):
+        with self._lock:
+            t_rx = self._t_queued[slot]
+            if not np.isnan(t_rx):
+                self._add(WIRE, [slot], [t - t_rx])
+                self._t_queued[slot] = np.nan
+
+    # ----- Stats
+
+    # Percentiles (seconds) of a stage, for one slot or the whole fleet (None if empty)
+    def percentiles(self, stage, slot=None, q=PERCENTILES):
+        with self._lock:
+            counts = self.counts[stage].sum(axis=0) if slot is None else self.counts[stage, slot].copy()
+        return hist_percentiles(counts, q)
+
+    def summary(self, slot=None, stage=None):
+        if stage is None:
+            stage = WIRE if self.counts[WIRE].any() else SEND
+        p = self.percentiles(stage, slot)
+        if p is None:
+            return "age -"
+        return "age " + "/".join("{:.0f}".format(v * 1e3) for v in p) + " ms"
+
+    def to_dict(self):
+        with self._lock:
+            counts = self.counts.copy()
+        data = {"stages": list(STAGES), "percentiles": list(PERCENTILES), "bin_edges": BIN_EDGES.tolist(),
+                "fleet": {}, "aircraft": {}}
+        for k, stage in enumerate(STAGES):
+            data["fleet"][stage] = stage_stats(counts[k].sum(axis=0))
+        for i, ac_id in enumerate(self.ac_ids):
+            data["aircraft"][str(ac_id)] = {stage: stage_stats(counts[k, i]) for k, stage in enumerate(STAGES)}
+            data["aircraft"][str(ac_id)]["hist"] = counts[:, i].tolist()
+        return data
+
+    def dump(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+# Percentiles of a histogram, as the upper edge of the bin where they fall
+def hist_percentiles(counts, q=PERCENTILES):
+    total = counts.sum()
+    if total == 0:
+        return None
+    cum = np.cumsum(counts)
+    idx = np.searchsorted(cum, np.asarray(q) / 100 * total)
+    edges = np.append(BIN_EDGES, np.inf)
+    return [float(edges[min(i, len(BIN_EDGES))]) for i in idx]
+
+def stage_stats(counts):
+    p = hist_percentiles(counts)
+    stats = {"n": int(counts.sum())}
+    if p is not None:
+        for q, v in zip(PERCENTILES, p):
+            stats["p{:d}_ms".format(q)] = v * 1e3
+    return stats
+
+def print_compare(before, after):
+    for stage in STAGES:
+        a, b = before["fleet"].get(stage, {}), after["fleet"].get(stage, {})
+        line = "{:<9s}".format(stage)
+        for q in PERCENTILES:
+            key = "p{:d}_ms".format(q)
+            if key in a and key in b:
+                line += " p{:d} {:8.1f} -> {:8.1f} ms ({:+.1f})".format(q, a[key], b[key], b[key] - a[key])
+            else:
+                line += " p{:d} {:>25s}".format(q, "-")
+        print(line)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two latency dumps of the CCF app")
+    parser.add_argument('before', help="latency .json before the change")
+    parser.add_argument('after', help="latency .json after the change")
+    args = parser.parse_args()
+
+    with open(args.before, 'r') as f:
+        before = json.load(f)
+    with open(args.after, 'r') as f:
+        after = json.load(f)
+    print_compare(before, after)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Round-trip latency of a transport: GET_DL_SETTING (ell_a) -> DL_VALUE.
+
+The requests are sent to every aircraft at a fixed rate, each reply is
+matched with its request and the round-trip times are summarized. Running
+it once per transport against the same aircraft (real, NPS or
+fleet_emulator.py) gives the latency difference between them, e.g. through
+the Ivy bus (with proxy_sim.py running) and straight over UDP (proxy stopped):
+
+    -> python3 latency_probe.py -ac_ids 1,2 -transport ivy -save ivy.json
+    -> python3 latency_probe.py -ac_ids 1,2 -transport udp -udp_links 1:4244:4245,2:4246:4247 -compare ivy.json
+
+With -transport local an in-process fleet_emulator answers the requests.
+"""
+
+import sys
+import json
+import time
+import threading
+import numpy as np
+
+from transport import Message, open_interface, LocalBus, LocalInterface
+from fleet_emulator import FleetEmulator, resolve_settings_ids
+
+PERCENTILES = (50, 90, 99)
+
+class LatencyProbe:
+    def __init__(self, interface, ac_ids):
+        self.interface = interface
+        self.ac_ids = list(ac_ids)
+        self.index = {ac_id: resolve_settings_ids(ac_id)["ell_a"] for ac_id in self.ac_ids}
+        self._lock = threading.Lock()
+        self._pending = {} # ac_id -> t_sent
+        self.rtt = []
+        self.lost = 0
+        self.interface.subscribe(self.dl_value_cb, Message("telemetry", "DL_VALUE"))
+
+    def dl_value_cb(self, ac_id, msg):
+        t = time.perf_counter()
+        if int(msg.get_field(0)) != self.index.get(ac_id):
+            return
+        with self._lock:
+            t_sent = self._pending.pop(ac_id, None)
+            if t_sent is not None:
+                self.rtt.append(t - t_sent)
+
+    def request(self, ac_id):
+        msg = Message("ground", "GET_DL_SETTING")
+        msg['ac_id'] = ac_id
+        msg['index'] = self.index[ac_id]
+        with self._lock:
+            if ac_id in self._pending:
+                self.lost += 1 # no reply since the last request
+            self._pending[ac_id] = time.perf_counter()
+        self.interface.send(msg)
+
+    def run(self, n_requests, rate):
+        period = 1. / rate
+        t0 = time.perf_counter()
+        for k in range(n_requests):
+            for ac_id in self.ac_ids:
+                self.request(ac_id)
+            delay = t0 + (k + 1) * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        time.sleep(min(1., period))
+        with self._lock:
+            self.lost += len(self._pending)
+            self._pending.clear()
+
+    def stats(self):
+        rtt = np.array(self.rtt) * 1e3
+        stats = {"replies": int(rtt.size), "lost": self.lost}
+        if rtt.size:
+            stats["mean_ms"] = float(rtt.mean())
+            stats["max_ms"] = float(rtt.max())
+            for p, v in zip(PERCENTILES, np.percentile(rtt, PERCENTILES)):
+                stats["p{:d}_ms".format(p)] = float(v)
+        return stats
+
+def print_stats(name, stats, ref=None):
+    line = "{:<6s} {:>6d} replies, {:>4d} lost".format(name, stats["replies"], stats["lost"])
+    if stats["replies"]:
+        line += ", mean {:.2f} ms, ".format(stats["mean_ms"])
+        line += ", ".join("p{:d} {:.2f} ms".format(p, stats["p{:d}_ms".format(p)]) for p in PERCENTILES)
+        line += ", max {:.2f} ms".format(stats["max_ms"])
+    print(line)
+    if ref is not None and stats["replies"] and ref["replies"]:
+        print("{:<6s} ".format("diff") + ", ".join("p{:d} {:+.2f} ms".format(
+            p, stats["p{:d}_ms".format(p)] - ref["p{:d}_ms".format(p)]) for p in PERCENTILES))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GET_DL_SETTING -> DL_VALUE round-trip latency")
+    parser.add_argument('-ac_ids', '--ac_ids', dest='ac_ids', default="1", help="aircraft ids")
+    parser.add_argument('-transport', '--transport', dest='transport', default=None, help="ivy, udp or local")
+    parser.add_argument('-udp_links', '--udp_links', dest='udp_links', default=None,
+                        help="udp links ac_id:out_port:in_port,... (AC side ports)")
+    parser.add_argument('-n', '--n', dest='n_requests', type=int, default=200, help="requests per aircraft")
+    parser.add_argument('-rate', '--rate', dest='rate', type=float, default=10., help="requests/s per aircraft")
+    parser.add_argument('-save', '--save', dest='save', default=None, help="save the stats (.json)")
+    parser.add_argument('-compare', '--compare', dest='compare', default=None, help="stats of another run (.json)")
+    args = parser.parse_args()
+
+    ac_ids = [int(ac_id) for ac_id in args.ac_ids.split(",")]
+
+    emulator = None
+    if args.transport == "local":
+        bus = LocalBus()
+        interface = LocalInterface("Latency probe", bus)
+        emulator = FleetEmulator(LocalInterface("Fleet emulator", bus), ac_ids, dt=0.005)
+        emulator.start()
+    else:
+        interface = open_interface("Latency probe", args.transport, udp_links=args.udp_links)
+
+    probe = LatencyProbe(interface, ac_ids)
+    time.sleep(0.5)
+    probe.run(args.n_requests, args.rate)
+    stats = probe.stats()
+    stats["transport"] = args.transport or "default"
+
+    ref = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            ref = json.load(f)
+        print_stats(ref.get("transport", "ref"), ref)
+    print_stats(stats["transport"], stats, ref)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+    if emulator is not None:
+        emulator.stop()
+    interface.shutdown()
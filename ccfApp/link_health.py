@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import numpy as np
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from fleet_state import FleetState
+
+"""\
+Age, rate and up/down state of one message stream (NAV or GVF) over the fleet.
+
+A link goes down when its last message is older than down_timeout, and only
+comes back up after up_msgs new messages, the last one younger than up_timeout.
+"""
+class LinkStream:
+    def __init__(self, name, n_ac, down_timeout, up_timeout, up_msgs, alpha):
+        self.name = name
+        self.down_timeout = down_timeout
+        self.up_timeout = up_timeout
+        self.up_msgs = up_msgs
+        self.alpha = alpha
+
+        self.up = np.zeros(n_ac, dtype=bool)
+        self.age = np.full(n_ac, np.inf)
+        self.rate = np.zeros(n_ac)
+        self._count_last = np.zeros(n_ac, dtype=np.int64)
+        self._count_down = np.zeros(n_ac, dtype=np.int64)
+
+    # Returns the slots that went (down, up) in this update
+    def update(self, now, dt, time_last, count):
+        age = now - time_last
+        self.age = np.where(np.isnan(age), np.inf, age)
+
+        if dt > 0:
+            self.rate += self.alpha * ((count - self._count_last) / dt - self.rate)
+        self._count_last[:] = count
+
+        went_down = self.up & (self.age > self.down_timeout)
+        went_up = ~self.up & (self.age < self.up_timeout) & (count - self._count_down >= self.up_msgs)
+
+        self.up[went_down] = False
+        self.up[went_up] = True
+        self._count_down[went_down] = count[went_down]
+        return np.flatnonzero(went_down), np.flatnonzero(went_up)
+
+    def summary(self):
+        n_up = np.count_nonzero(self.up)
+        rate = self.rate[self.up].mean() if n_up else 0.
+        return "{:s} {:d}/{:d} ({:.1f} Hz)".format(self.name, n_up, self.up.size, rate)
+
+"""\
+Link-health monitor of the NAV and GVF telemetry of the whole fleet.
+
+It runs on its own QTimer, owns the nav/gvf state flags of the InfoAC
+objects and publishes aggregated changes: one health_changed signal and
+one log line per transition kind, whatever the number of aircraft. The
+summary (with the message rates) is refreshed on every check, but
+health_changed is only emitted when a link goes up or down.
+"""
+class LinkHealthMonitor(QObject):
+
+    health_changed = Signal()
+
+    def __init__(self, log_reporter, period=0.25, down_timeout=4., up_timeout=1., up_msgs=2, alpha=0.2,
+                 clock=time.monotonic):
+        super().__init__()
+        self.log_reporter = log_reporter
+        self.clock = clock
+        self.period = period
+        self.params = (down_timeout, up_timeout, up_msgs, alpha)
+        self.summary = "-"
+        self._links_up = None # (NAV up, GVF up, fleet size) of the last notification
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(period * 1000))
+        self.timer.timeout.connect(self.check)
+        self.reset(FleetState(0), [])
+
+    def reset(self, fleet, ac_info_list):
+        self.fleet = fleet
+        self.ac_info_list = ac_info_list
+        self.nav = LinkStream("NAV", fleet.n_ac, *self.params)
+        self.gvf = LinkStream("GVF", fleet.n_ac, *self.params)
+        self._t_last = None
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def check(self):
+        fleet = self.fleet
+        now = self.clock()
+        dt = 0. if self._t_last is None else now - self._t_last
+        self._t_last = now
+
+        changed = False
+        for stream, time_last, count, setter in (
+                (self.nav, fleet.time_last_nav, fleet.nav_count, "set_initialized_nav"),
+                (self.gvf, fleet.time_last_gvf, fleet.gvf_count, "set_initialized_gvf")):
+            went_down, went_up = stream.update(now, dt, time_last, count)
+
+            for slots, state, msg in ((went_down, False, "WARNING: {:s} message timeout in AC-{:s} -"),
+                                      (went_up, True, "INFO: {:s} link up in AC-{:s} -")):
+                if slots.size == 0:
+                    continue
+                for i in slots:
+                    getattr(self.ac_info_list[i], setter)(state)
+                labels = ", AC-".join(self.ac_info_list[i].idLabel for i in slots)
+                self.log_reporter.log(msg.format(stream.name, labels))
+                changed = True
+
+        self.summary = self.nav.summary() + " | " + self.gvf.summary()
+        links_up = (np.count_nonzero(self.nav.up), np.count_nonzero(self.gvf.up), fleet.n_ac)
+        if changed or links_up != self._links_up:
+            self._links_up = links_up
+            self.health_changed.emit()
@@ -29,6 +29,7 @@ class LogReporter(QObject):
         super().__init__()
         self.last_log = init_msg
         self.full_log = init_msg
+        self.count = 1 if init_msg else 0
         self.console_log_changed.emit()
 
     @Property(str, notify=console_log_changed)
@@ -42,4 +43,5 @@ class LogReporter(QObject):
         else:
             self.full_log = self.full_log + "\n" + msg
         self.last_log = msg
+        self.count += 1
         self.console_log_changed.emit()
\ No newline at end of file
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Local metrics endpoint in the Prometheus text format (no extra dependency).
+
+Counters are updated in place from the bus callbacks; everything that is
+already kept somewhere else (link health, tick stats, queue sizes...) is
+read by a collector function only when the endpoint is scraped.
+
+    -> python3 ccf_app.py -metrics 9464
+    -> curl http://127.0.0.1:9464/metrics
+"""
+
+import time
+import threading
+from os import getenv
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = getenv("CCF_METRICS_PORT") # None: no endpoint
+DEFAULT_ADDRESS = "127.0.0.1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def format_value(value):
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join('{:s}="{:s}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in zip(names, values)) + "}"
+
+"""\
+Metric family: one value per label combination (counter or gauge), or a
+sum/count pair for the "summary" type
+"""
+class Metric:
+    def __init__(self, name, kind, help, labels=()):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, value=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def set(self, *label_values, value=0):
+        with self._lock:
+            self._values[label_values] = value
+
+    def observe(self, *label_values, value=0):
+        with self._lock:
+            s, n = self._values.get(label_values, (0., 0))
+            self._values[label_values] = (s + value, n + 1)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            labels = format_labels(self.labels, label_values)
+            if self.kind == "summary":
+                yield self.name + "_sum" + labels, value[0]
+                yield self.name + "_count" + labels, value[1]
+            else:
+                yield self.name + labels, value
+
+"""\
+Metric family whose samples are read by fn() at scrape time, as a
+{label_values: value} dict (or a single value without labels)
+"""
+class CollectedMetric(Metric):
+    def __init__(self, name, kind, help, fn, labels=()):
+        super().__init__(name, kind, help, labels)
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            if not isinstance(label_values, tuple):
+                label_values = (label_values,)
+            yield self.name + format_labels(self.labels, label_values), value
+
+class MetricsRegistry:
+    def __init__(self, prefix="ccf"):
+        self.prefix = prefix
+        self._metrics = []
+        self.t_start = time.time()
+        self.gauge_fn("start_time_seconds", "Start time of the process (unix time)", lambda: self.t_start)
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def _name(self, name):
+        return self.prefix + "_" + name
+
+    def counter(self, name, help, labels=()):
+        return self._add(Metric(self._name(name), "counter", help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Metric(self._name(name), "gauge", help, labels))
+
+    def summary(self, name, help, labels=()):
+        return self._add(Metric(self._name(name), "summary", help, labels))
+
+    def counter_fn(self, name, help, fn, labels=()):
+        return self._add(CollectedMetric(self._name(name), "counter", help, fn, labels))
+
+    def gauge_fn(self, name, help, fn, labels=()):
+        return self._add(CollectedMetric(self._name(name), "gauge", help, fn, labels))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e: # a broken collector must not take the endpoint down
+                lines.append("# {:s} collector error: {:s}".format(metric.name, str(e)))
+                continue
+            lines.append("# HELP {:s} {:s}".format(metric.name, metric.help))
+            lines.append("# TYPE {:s} {:s}".format(metric.name, metric.kind))
+            for sample, value in samples:
+                lines.append("{:s} {:s}".format(sample, format_value(value)))
+        return "\n".join(lines) + "\n"
+
+"""\
+Bus traffic counters: received msgs per type and aircraft, and the time
+spent in each callback. The callbacks are wrapped at subscription time,
+so they don't need to know about the metrics.
+"""
+class BusMetrics:
+    def __init__(self, registry):
+        self.received = registry.counter("msgs_received_total", "Messages received", ("msg", "ac_id"))
+        self.sent = registry.counter("msgs_sent_total", "Messages sent", ("msg", "ac_id"))
+        self.callback = registry.summary("callback_seconds", "Time spent in the bus callbacks", ("msg",))
+
+    def wrap(self, callback):
+        received, cb_time = self.received, self.callback
+
+        def timed_cb(ac_id, msg):
+            t0 = time.perf_counter()
+            callback(ac_id, msg)
+            cb_time.observe(msg.name, value=time.perf_counter() - t0)
+            received.inc(msg.name, ac_id)
+        return timed_cb
+
+    def subscribe(self, interface, callback, msg=None):
+        interface.subscribe(self.wrap(callback), msg)
+
+    def on_sent(self, ac_id, msg):
+        self.sent.inc(msg.name, ac_id)
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+"""\
+HTTP endpoint serving the registry on http://address:port/metrics
+"""
+class MetricsServer:
+    def __init__(self, registry, port, address=DEFAULT_ADDRESS):
+        self.server = ThreadingHTTPServer((address, int(port)), _Handler)
+        self.server.daemon_threads = True
+        self.server.registry = registry
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self._thread = None
+
+# Registry and started server on `port` (None if not given or already in use)
+def serve(port, prefix="ccf", address=DEFAULT_ADDRESS):
+    if port is None:
+        port = DEFAULT_PORT
+    if port is None:
+        return None, None
+    registry = MetricsRegistry(prefix)
+    try:
+        server = MetricsServer(registry, port, address)
+    except OSError as e:
+        print("ERROR: metrics endpoint on {:s}:{:s} - {:s} -".format(address, str(port), str(e)))
+        return None, None
+    server.start()
+    return registry, server
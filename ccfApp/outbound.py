@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import threading
+from collections import OrderedDict, deque
+
+# Priority classes (lower is sent first)
+CONTROL = 0     # formation radius commands
+SETTINGS = 1    # operator settings (gains, ...)
+POLL = 2        # GET_DL_SETTING requests
+PRIORITY_NAMES = ("control", "settings", "poll")
+
+"""\
+Token bucket of one aircraft datalink: `rate` msgs/s with bursts of `burst` msgs
+"""
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.t_last = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.t_last) * self.rate)
+        self.t_last = now
+
+    # Time to wait (s) until `need` tokens are available
+    def wait_time(self, need=1.):
+        return max(0., (need - self.tokens) / self.rate)
+
+"""\
+Prioritized outbound message scheduler of the Ivy interface.
+
+Every message is queued with a priority class and its destination aircraft,
+and a single sender thread sends them: control commands first, operator
+settings second and polling last. Each aircraft has its own token bucket,
+so a saturated aircraft does not block the others. The lower classes leave
+`reserve` tokens of the bucket to the control commands, so a burst of
+settings or polling never delays the next radius command. A queued message with the same `key` (e.g. (ac_id, index) of a
+DL_SETTING) as a newer one is replaced by it, so stale commands are never
+sent on a congested link. on_sent(ac_id, msg) is called after every send.
+A message that can not be sent (or whose on_sent fails) is counted in
+`errors` (and reported through log_reporter) and the sender keeps going
+with the next one.
+"""
+class OutboundScheduler:
+    def __init__(self, interface, rate=20., burst=10, clock=time.monotonic, on_sent=None, log_reporter=None,
+                 reserve=1):
+        self.interface = interface
+        self.on_sent = on_sent
+        self.log_reporter = log_reporter
+        self.rate = rate    # msgs/s per aircraft
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1) # tokens kept for CONTROL
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES] # ac_id -> deque of [key, msg]
+        self._keys = [{} for _ in PRIORITY_NAMES]               # key -> queued [key, msg]
+        self._buckets = {}
+        self._queued = 0
+        self._in_flight = 0
+        self._running = False
+        self._thread = None
+
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self.replaced = 0
+        self.errors = 0
+        self._last_error = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self.run, name="outbound", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Queue msg to ac_id (any thread)
+    def send(self, ac_id, msg, priority=SETTINGS, key=None):
+        with self._cond:
+            if key is not None:
+                item = self._keys[priority].get(key)
+                if item is not None:
+                    item[1] = msg
+                    self.replaced += 1
+                    return
+            item = [key, msg]
+            if key is not None:
+                self._keys[priority][key] = item
+            queue = self._queues[priority].get(ac_id)
+            if queue is None:
+                queue = self._queues[priority][ac_id] = deque()
+            queue.append(item)
+            self._queued += 1
+            self._cond.notify()
+
+    def queued(self):
+        return self._queued
+
+    # Wait until every queued message is sent (True) or the timeout expires (False)
+    def wait_idle(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self._queued == 0 and self._in_flight == 0, timeout)
+
+    # Next sendable (priority, ac_id, item), or the time to wait for one (called with the lock)
+    def _next(self, now):
+        wait = None
+        for priority, queues in enumerate(self._queues):
+            for ac_id in queues:
+                bucket = self._buckets.get(ac_id)
+                if bucket is None:
+                    bucket = self._buckets[ac_id] = TokenBucket(self.rate, self.burst, now)
+                bucket.refill(now)
+                need = 1. if priority == CONTROL else 1. + self.reserve
+                if bucket.tokens >= need:
+                    return (priority, ac_id), 0.
+                dt = bucket.wait_time(need)
+                wait = dt if wait is None else min(wait, dt)
+        return None, wait
+
+    def run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    now = self.clock()
+                    found, wait = self._next(now)
+                    if found is not None:
+                        break
+                    self._cond.notify_all() # wake up wait_idle()
+                    self._cond.wait(wait)
+
+                priority, ac_id = found
+                queues = self._queues[priority]
+                queue = queues[ac_id]
+                key, msg = queue.popleft()
+                if key is not None:
+                    del self._keys[priority][key]
+                if queue:
+                    queues.move_to_end(ac_id) # round-robin between aircraft
+                else:
+                    del queues[ac_id]
+                self._buckets[ac_id].tokens -= 1.
+                self._queued -= 1
+                self._in_flight += 1
+
+            ok = False
+            try:
+                self.interface.send(msg)
+                ok = True
+                if self.on_sent is not None:
+                    self.on_sent(ac_id, msg)
+            except Exception as e:
+                self.error(ac_id, msg, e)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    if ok:
+                        self.sent[priority] += 1
+
+    # Count a failed send (only printed when it differs from the last one, e.g. a link down)
+    def error(self, ac_id, msg, e):
+        self.errors += 1
+        error = "{:s} to AC-{:s}: {:s}".format(msg.name, str(ac_id), repr(e))
+        if error != self._last_error:
+            self._last_error = error
+            if self.log_reporter is not None:
+                self.log_reporter.log("ERROR: outbound " + error + " -")
+            else:
+                print("ERROR: outbound " + error + " -")
+
+    def summary(self):
+        sent = "/".join("{:d}".format(n) for n in self.sent)
+        return "OUT {:s} sent, {:d} queued, {:d} errors".format(sent, self._queued, self.errors)
+
+# Delay (s) of a CONTROL msg queued while a POLL flood to the same aircraft is being sent
+def control_delay(n_poll, rate=20., burst=10):
+    sent = {}
+
+    class Interface:
+        def send(self, msg):
+            sent[msg] = time.monotonic()
+
+    scheduler = OutboundScheduler(Interface(), rate, burst)
+    scheduler.start()
+    for k in range(n_poll):
+        scheduler.send(1, ("poll", k), POLL)
+    time.sleep((2. * burst + 0.5) / rate) # the flood has used every token it can, half a token ago
+    t0 = time.monotonic()
+    scheduler.send(1, "control", CONTROL)
+    while "control" not in sent and time.monotonic() - t0 < 5.:
+        time.sleep(0.001)
+    scheduler.stop()
+    return sent.get("control", float("inf")) - t0
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CONTROL delay under a POLL flood")
+    parser.add_argument('-flood', '--flood', dest='n_poll', type=int, default=1000, help="queued POLL msgs")
+    parser.add_argument('-max', '--max', dest='max_delay', type=float, default=0.01, help="allowed delay (s)")
+    args = parser.parse_args()
+
+    delay = control_delay(args.n_poll)
+    print("CONTROL sent {:.1f} ms after being queued behind {:d} POLL msgs".format(delay * 1e3, args.n_poll))
+    if delay > args.max_delay:
+        print("FAIL: the control command waited for the polling tokens")
+        sys.exit(1)
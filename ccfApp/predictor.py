@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from ccf_kernel import wrap_to_pi
+
+"""\
+Latency-compensating position predictor.
+
+Each aircraft's phase on its own GVF ellipse (XYc, ell_a, ell_b) is tracked
+from the NAV receive timestamps, and its phase rate is low-pass filtered.
+predict() moves every aircraft along its ellipse from its last received
+position up to the control timestamp, keeping its normalized distance to
+the ellipse. Everything is vectorized over the fleet.
+"""
+class PhasePredictor:
+    def __init__(self, n_ac, alpha=0.5, max_horizon=2., max_omega=2.):
+        self.alpha = alpha
+        self.max_horizon = max_horizon  # secconds
+        self.max_omega = max_omega      # rad/s
+
+        self.phase_last = np.full(n_ac, np.nan)
+        self.t_last = np.full(n_ac, np.nan)
+        self.omega = np.zeros(n_ac)
+        self.omega_init = np.zeros(n_ac, dtype=bool)
+        self.XY = np.zeros((n_ac, 2))
+
+    # Ellipse axes, falling back to the current distance (circle) before the first GVF msg
+    @staticmethod
+    def _axes(snap, dX):
+        dist = np.hypot(dX[:,0], dX[:,1])
+        a = np.where(np.isfinite(snap.ell[:,0]) & (snap.ell[:,0] > 0), snap.ell[:,0], dist)
+        b = np.where(np.isfinite(snap.ell[:,1]) & (snap.ell[:,1] > 0), snap.ell[:,1], dist)
+        return np.maximum(a, 1e-6), np.maximum(b, 1e-6)
+
+    # Feed a new FleetSnapshot to update the phase rate estimates
+    def update(self, snap):
+        dX = snap.XY - snap.XYc
+        a, b = self._axes(snap, dX)
+        phase = np.arctan2(dX[:,1] / b, dX[:,0] / a)
+
+        dt = snap.time_last_nav - self.t_last
+        new = np.isfinite(dt) & (dt > 0)
+        omega = wrap_to_pi(phase - self.phase_last) / np.where(new, dt, 1.)
+        filtered = np.where(self.omega_init, self.omega + self.alpha * (omega - self.omega), omega)
+        self.omega = np.where(new, filtered, self.omega)
+        self.omega_init |= new
+        np.clip(self.omega, -self.max_omega, self.max_omega, out=self.omega)
+
+        fresh = np.isfinite(snap.time_last_nav)
+        self.phase_last = np.where(fresh, phase, self.phase_last)
+        self.t_last = np.where(fresh, snap.time_last_nav, self.t_last)
+
+    # Predicted positions at the control time t_ctrl (same clock as the timestamps)
+    def predict(self, snap, t_ctrl):
+        dX = snap.XY - snap.XYc
+        a, b = self._axes(snap, dX)
+        rho = np.hypot(dX[:,0] / a, dX[:,1] / b)
+        phase = np.arctan2(dX[:,1] / b, dX[:,0] / a)
+
+        horizon = np.nan_to_num(t_ctrl - snap.time_last_nav, nan=0.)
+        np.clip(horizon, 0., self.max_horizon, out=horizon)
+        phase = phase + self.omega * horizon
+
+        self.XY[:,0] = snap.XYc[:,0] + rho * a * np.cos(phase)
+        self.XY[:,1] = snap.XYc[:,1] + rho * b * np.sin(phase)
+        return self.XY
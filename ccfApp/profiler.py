@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+On-demand profiling of the running app, without restarting it.
+
+A capture started from the control panel combines:
+    - cProfile of the thread that starts it (the GUI thread),
+    - a sampling profiler of every Python thread (GUI, Ivy, CCF QThread,
+      outbound sender...), as collapsed stacks for flame graphs,
+    - tracemalloc snapshots at start and stop (top allocation growth),
+    - the CPU time used by every thread during the capture.
+
+When stopped, it writes <prefix>.prof (pstats), <prefix>_stacks.txt and
+<prefix>_summary.txt:
+
+    -> python3 -m pstats profiles/profile_20230101_120000.prof
+    -> flamegraph.pl profiles/profile_20230101_120000_stacks.txt > flame.svg
+"""
+
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+TOP_LINES = 30
+
+# CPU time (s) of the thread `ident` (None where pthread CPU clocks are not available)
+def thread_cpu_time(ident):
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+"""\
+Sampling profiler of all the Python threads: sys._current_frames() every
+`interval` seconds, counting the collapsed stack of every thread. The CPU
+time of every thread is also read every `cpu_every` samples, so the threads
+that exit during the capture are still accounted for.
+"""
+class StackSampler:
+    def __init__(self, interval=0.005, cpu_every=10):
+        self.interval = interval
+        self.cpu_every = cpu_every
+        self.stacks = Counter()     # (ident, "f1;f2;f3") -> samples
+        self.cpu = {}               # ident -> last CPU time read (s)
+        self.names = {}             # ident -> name of the threads seen
+        self.samples = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        own = threading.get_ident()
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{:s} ({:s}:{:d})".format(code.co_name, code.co_filename.split("/")[-1],
+                                                           code.co_firstlineno))
+                    frame = frame.f_back
+                self.stacks[(ident, ";".join(reversed(stack)))] += 1
+            if self.samples % self.cpu_every == 0:
+                self.names.update((t.ident, t.name) for t in threading.enumerate())
+                for ident in sys._current_frames():
+                    if ident != own:
+                        t = thread_cpu_time(ident)
+                        if t is not None:
+                            self.cpu[ident] = t
+            self.samples += 1
+            time.sleep(self.interval)
+
+    # Samples per thread and per function (leaf frame) of every thread
+    def top(self):
+        threads, leaves = Counter(), {}
+        for (ident, stack), n in self.stacks.items():
+            threads[ident] += n
+            leaves.setdefault(ident, Counter())[stack.rsplit(";", 1)[-1]] += n
+        return threads, leaves
+
+"""\
+One profiling capture. thread_names() gives readable names of the thread
+idents that the threading module doesn't know (the QThreads), read when
+the capture stops.
+"""
+class ProfilingSession:
+    def __init__(self, prefix, thread_names=None, cprofile=True, sampling=True, memory=True, interval=0.005):
+        self.prefix = prefix
+        self.thread_names = dict if thread_names is None else thread_names
+        self.profile = cProfile.Profile() if cprofile else None
+        self.sampler = StackSampler(interval) if sampling else None
+        self.memory = memory
+        self._own_tracemalloc = False
+        self._mem_start = None
+        self._cpu_start = {}
+        self.t_start = None
+        self.files = []
+
+    def _cpu_times(self):
+        times = {}
+        for ident in sys._current_frames():
+            t = thread_cpu_time(ident)
+            if t is not None:
+                times[ident] = t
+        return times
+
+    def start(self):
+        self.t_start = time.perf_counter()
+        self._cpu_start = self._cpu_times()
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                self._own_tracemalloc = True
+            self._mem_start = tracemalloc.take_snapshot()
+        if self.sampler is not None:
+            self.sampler.start()
+        if self.profile is not None:
+            self.profile.enable()
+
+    # Stop the capture and write its files (returns their names)
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        duration = time.perf_counter() - self.t_start
+        cpu_stop = self._cpu_times()
+        exited = set()
+        if self.sampler is not None: # last CPU time read of the threads gone since then
+            exited = set(self.sampler.cpu) - set(cpu_stop)
+            cpu_stop.update({ident: self.sampler.cpu[ident] for ident in exited})
+
+        mem_stop = None
+        if self.memory:
+            mem_stop = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+
+        names = self.names()
+        summary = io.StringIO()
+        summary.write("Capture of {:.1f} s\n".format(duration))
+        self.write_cpu(summary, names, duration, cpu_stop, exited)
+
+        if self.profile is not None:
+            self.profile.dump_stats(self.prefix + ".prof")
+            self.files.append(self.prefix + ".prof")
+            summary.write("\n----- cProfile of the GUI thread (cumulative)\n")
+            pstats.Stats(self.profile, stream=summary).sort_stats("cumulative").print_stats(TOP_LINES)
+
+        if self.sampler is not None:
+            with open(self.prefix + "_stacks.txt", 'w') as f:
+                for (ident, stack), n in self.sampler.stacks.most_common():
+                    f.write("{:s};{:s} {:d}\n".format(names.get(ident, str(ident)), stack, n))
+            self.files.append(self.prefix + "_stacks.txt")
+            self.write_samples(summary, names)
+
+        if mem_stop is not None:
+            summary.write("\n----- Allocation growth (tracemalloc)\n")
+            for stat in mem_stop.compare_to(self._mem_start, "lineno")[:TOP_LINES]:
+                summary.write(str(stat) + "\n")
+
+        with open(self.prefix + "_summary.txt", 'w') as f:
+            f.write(summary.getvalue())
+        self.files.append(self.prefix + "_summary.txt")
+        return self.files
+
+    # Readable names of the current threads
+    def names(self):
+        names = {} if self.sampler is None else dict(self.sampler.names)
+        names.update((t.ident, t.name) for t in threading.enumerate())
+        names[threading.main_thread().ident] = "GUI"
+        names.update(self.thread_names())
+        return names
+
+    def write_cpu(self, f, names, duration, cpu_stop, exited=()):
+        f.write("\n----- CPU time per thread\n")
+        if not cpu_stop:
+            f.write("not available on this platform\n")
+        elif self.sampler is None:
+            f.write("(threads that exited during the capture are not listed without the sampling profiler)\n")
+        elif exited:
+            f.write("(exited: CPU time until the last read, every {:.0f} ms)\n".format(
+                self.sampler.interval * self.sampler.cpu_every * 1e3))
+        rows = []
+        for ident, t in cpu_stop.items():
+            cpu = t - self._cpu_start.get(ident, 0.)
+            name = names.get(ident, str(ident)) + (" (exited)" if ident in exited else "")
+            rows.append((cpu, name))
+        for cpu, name in sorted(rows, reverse=True):
+            f.write("{:<24s} {:8.3f} s {:6.1f} %\n".format(name, cpu, 100 * cpu / max(duration, 1e-9)))
+
+    def write_samples(self, f, names):
+        threads, leaves = self.sampler.top()
+        f.write("\n----- Sampled functions per thread ({:d} samples every {:.0f} ms)\n".format(
+            self.sampler.samples, self.sampler.interval * 1e3))
+        for ident, n in threads.most_common():
+            f.write("{:s} ({:d} samples)\n".format(names.get(ident, str(ident)), n))
+            for leaf, k in leaves[ident].most_common(10):
+                f.write("    {:6.1f} % {:s}\n".format(100 * k / n, leaf))
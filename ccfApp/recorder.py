@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Compact binary recorder of the CCF app telemetry and commands.
+
+File format (.ccfrec, little endian, append-only):
+    header  16 bytes: MAGIC (8 bytes), record size (uint32), reserved (uint32)
+    records RECORD_DTYPE, one per message
+
+Every record keeps the receive/send timestamp (panel clock: the virtual one
+during a replay), the message kind, the aircraft id, a setting index (DL
+messages) and up to 7 values:
+    NAVIGATION      [x, y]
+    ROTORCRAFT_FP   [east, north] (raw fields, /256 to get meters)
+    GVF             [traj, s, p0, p1, p2, p3, p4]
+    DL_VALUE        [value]
+    DL_SETTING      [value] (sent)
+    GET_DL_SETTING  [] (sent)
+
+Files can be read while being written: load() memory-maps the complete records.
+
+    -> python3 recorder.py records/ccf_20230101_120000.ccfrec
+"""
+
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+MAGIC = b"CCFREC01"
+HEADER_SIZE = 16
+N_VALUES = 7
+
+NAVIGATION, ROTORCRAFT_FP, GVF, DL_VALUE, DL_SETTING, GET_DL_SETTING = range(1, 7)
+KIND_NAMES = {NAVIGATION: "NAVIGATION", ROTORCRAFT_FP: "ROTORCRAFT_FP", GVF: "GVF",
+              DL_VALUE: "DL_VALUE", DL_SETTING: "DL_SETTING", GET_DL_SETTING: "GET_DL_SETTING"}
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("ac_id", "<u2"),
+    ("kind", "u1"),
+    ("flags", "u1"),
+    ("index", "<i4"),
+    ("values", "<f8", (N_VALUES,)),
+])
+
+def header():
+    return MAGIC + np.array([RECORD_DTYPE.itemsize, 0], dtype="<u4").tobytes()
+
+# Memory-mapped records of a .ccfrec file (a trailing partial record is ignored)
+def load(filename):
+    with open(filename, 'rb') as f:
+        head = f.read(HEADER_SIZE)
+        size = f.seek(0, 2)
+    if head[:8] != MAGIC:
+        raise ValueError("{:s} is not a .ccfrec file".format(str(filename)))
+    if int(np.frombuffer(head[8:12], dtype="<u4")[0]) != RECORD_DTYPE.itemsize:
+        raise ValueError("{:s} has an unsupported record size".format(str(filename)))
+
+    n = (size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(filename, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(n,))
+
+"""\
+Append-only recorder. record() only appends a tuple to a deque (no lock, no
+disk access), so it can be called from the Ivy callbacks; a background thread
+packs the pending records into a preallocated buffer and writes them to disk
+every `period` seconds. After a write error the recording is over: the error
+is reported, the next records are dropped (and counted) and stop() returns it.
+"""
+class TelemetryRecorder:
+    def __init__(self, filename, period=0.2, chunk=4096, clock=time.monotonic, log_reporter=None):
+        self.filename = filename
+        self.period = period
+        self.clock = clock
+        self.log_reporter = log_reporter
+
+        self._pending = deque()
+        self._buffer = np.zeros(chunk, dtype=RECORD_DTYPE)
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None   # OSError that ended the recording
+
+    def start(self):
+        self._file = open(self.filename, 'wb')
+        self._file.write(header())
+        self._file.flush()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="recorder", daemon=True)
+        self._thread.start()
+
+    # Stop the writer and close the file. Returns the write error (None if every record was saved)
+    def stop(self):
+        if self._thread is None:
+            return self.error
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self._file.close()
+        except OSError as e:
+            self.failed(e)
+        self._file = None
+        return self.error
+
+    # Queue one record (any thread, never blocks)
+    def record(self, kind, ac_id, index=-1, values=()):
+        if self.error is not None:
+            self.dropped += 1
+            return
+        self._pending.append((self.clock(), kind, ac_id, index, values))
+        self.recorded += 1
+
+    def run(self):
+        try:
+            while not self._stop.wait(self.period):
+                self.write_pending()
+            self.write_pending()
+        except OSError as e:
+            self.failed(e)
+
+    def failed(self, e):
+        if self.error is None:
+            self.error = e
+            msg = "ERROR: recording to {:s} stopped ({:s}) -".format(self.filename, str(e))
+            if self.log_reporter is not None:
+                self.log_reporter.log(msg)
+            else:
+                print(msg)
+        self.dropped += len(self._pending)
+        self._pending.clear()
+
+    def write_pending(self):
+        buffer = self._buffer
+        while self._pending:
+            items = []
+            while self._pending and len(items) < buffer.size:
+                items.append(self._pending.popleft())
+            n = len(items)
+
+            t, kind, ac_id, index, vals = zip(*items)
+            buffer["t"][:n] = t
+            buffer["kind"][:n] = kind
+            buffer["ac_id"][:n] = ac_id
+            buffer["index"][:n] = index
+            values = buffer["values"]
+            values[:n] = np.nan
+            for i, v in enumerate(vals):
+                if v:
+                    values[i, :len(v)] = v
+            try:
+                self._file.write(buffer[:n].tobytes())
+            except OSError:
+                self.dropped += n
+                raise
+            self.written += n
+        self._file.flush()
+
+    def summary(self):
+        if self.error is not None:
+            return "REC {:d} records, {:d} dropped (write error)".format(self.written, self.dropped)
+        return "REC {:d} records".format(self.written)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summary of a .ccfrec telemetry record")
+    parser.add_argument('filename', help=".ccfrec file")
+    args = parser.parse_args()
+
+    rec = load(args.filename)
+    print("{:d} records".format(rec.size))
+    if rec.size:
+        print("duration {:.1f} s".format(rec["t"][-1] - rec["t"][0]))
+        for kind, name in KIND_NAMES.items():
+            sel = rec["kind"] == kind
+            if np.any(sel):
+                print("  {:<16s} {:>9d} msgs from {:d} AC".format(
+                    name, np.count_nonzero(sel), np.unique(rec["ac_id"][sel]).size))
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Replay of .ccfrec recordings through ACPanel and FormationControlWorker.
+
+The recorded messages are fed to the same ACPanel Ivy callbacks, without any
+Ivy bus, while a virtual clock follows the recorded timestamps. The CCF
+steps and the link-health checks run on that clock at the formation rate,
+so a replay is deterministic whatever its speed: 1 (real time), N (N times
+faster) or 0 (as fast as possible). The file is read in chunks, so long
+recordings never need to fit in memory.
+
+The control outputs (radius commands of every tick) can be saved and later
+compared against, as a regression check of the control path.
+
+    -> python3 replay.py records/ccf_20230101_120000.ccfrec -json formation/three_aircraft.json -speed 0
+    -> python3 replay.py records/ccf_20230101_120000.ccfrec -json formation/three_aircraft.json -save ref.npz
+    -> python3 replay.py records/ccf_20230101_120000.ccfrec -json formation/three_aircraft.json -compare ref.npz
+"""
+
+import sys
+import time
+import numpy as np
+
+import recorder as rec
+import latency
+
+"""\
+Virtual clock, moved forward by the replay engine
+"""
+class ReplayClock:
+    def __init__(self, t=0.):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+"""\
+Minimal PprzMessage stand-in with the fields read by the ACPanel callbacks
+"""
+class ReplayMsg:
+    def __init__(self, name, fields):
+        self.name = name
+        self._fields = fields
+
+    def get_field(self, idx):
+        return self._fields[idx]
+
+"""\
+Stand-in for IvyMessagesInterface: no subscriptions, counts the sent msgs
+"""
+class ReplayInterface:
+    def __init__(self):
+        self.sent = 0
+
+    def subscribe(self, callback, msg):
+        pass
+
+    def send(self, msg):
+        self.sent += 1
+
+    def shutdown(self):
+        pass
+
+# Records of a .ccfrec file, read in chunks of `chunk` records
+def iter_records(filename, chunk=65536):
+    with open(filename, 'rb') as f:
+        head = f.read(rec.HEADER_SIZE)
+        if head[:8] != rec.MAGIC:
+            raise ValueError("{:s} is not a .ccfrec file".format(str(filename)))
+        size = rec.RECORD_DTYPE.itemsize
+        while True:
+            data = f.read(chunk * size)
+            n = len(data) // size
+            if n == 0:
+                return
+            yield np.frombuffer(data[:n * size], dtype=rec.RECORD_DTYPE)
+
+# (callback name, message) of a received record, or None for the sent ones
+def to_msg(kind, index, v):
+    if kind == rec.NAVIGATION:
+        return "navigation_cb", ReplayMsg("NAVIGATION", (None, None, v[0], v[1]))
+    if kind == rec.ROTORCRAFT_FP:
+        return "rotorcraft_fp_cb", ReplayMsg("ROTORCRAFT_FP", (v[0], v[1]))
+    if kind == rec.GVF:
+        param = [p for p in v[2:] if not np.isnan(p)]
+        return "gvf_cb", ReplayMsg("GVF", (None, v[0], v[1], None, param))
+    if kind == rec.DL_VALUE:
+        return "dl_values_cb", ReplayMsg("DL_VALUE", (index, v[0]))
+    return None
+
+"""\
+Drives an ACPanel (with its formation already loaded) from a recording
+"""
+class ReplayEngine:
+    def __init__(self, panel, filename, speed=0., chunk=65536):
+        from formationcontrol import FormationControlWorker
+
+        self.panel = panel
+        self.filename = filename
+        self.speed = speed
+        self.chunk = chunk
+
+        self.clock = ReplayClock()
+        panel.conf.clock = self.clock
+
+        self.worker = FormationControlWorker(panel.conf, panel.log_reporter)
+        self.worker.progress.connect(panel.commit_all_ac_rad)
+
+        self.msgs = 0
+        self.recorded_cmds = 0
+        self.t_ticks = []
+        self.u_ticks = []
+
+    def tick(self, t):
+        self.clock.t = t
+        self.worker.step()
+        self.t_ticks.append(t)
+        self.u_ticks.append(np.array(self.panel.conf.u_list, dtype=float))
+
+    def run(self):
+        panel = self.panel
+        period = 1. / panel.conf.rate
+        check_period = panel.link_monitor.period
+        t_tick = t_check = None
+        t0 = wall0 = None
+
+        for records in iter_records(self.filename, self.chunk):
+            for t, ac_id, kind, flags, index, v in records.tolist():
+                if t0 is None:
+                    t0, wall0 = t, time.perf_counter()
+                    t_tick, t_check = t + period, t
+
+                # Control ticks and link-health checks due before this message
+                while min(t_tick, t_check) <= t:
+                    if t_check <= t_tick:
+                        self.clock.t = t_check
+                        panel.link_monitor.check()
+                        t_check += check_period
+                    else:
+                        self.tick(t_tick)
+                        t_tick += period
+
+                if self.speed > 0:
+                    delay = (t - t0) / self.speed - (time.perf_counter() - wall0)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                self.clock.t = t
+                msg = to_msg(kind, index, v)
+                if msg is None:
+                    self.recorded_cmds += kind == rec.DL_SETTING
+                    continue
+                callback, msg = msg
+                getattr(panel, callback)(ac_id, msg)
+                self.msgs += 1
+
+        panel.outbound.wait_idle(5.)
+        return self.outputs()
+
+    # Time and radius commands (u) of every CCF tick
+    def outputs(self):
+        n_ac = self.panel.conf.fleet.n_ac
+        t = np.array(self.t_ticks)
+        u = np.array(self.u_ticks).reshape(len(self.t_ticks), n_ac) if self.u_ticks else np.zeros((0, n_ac))
+        return t, u
+
+# ACPanel with the formation of json_path loaded and the replay interface
+def replay_panel(json_path):
+    from acpanel import ACPanel
+
+    interface = ReplayInterface()
+    panel = ACPanel(interface=interface)
+    panel.link_monitor.stop()
+    panel.json_path = json_path
+    panel.read_json_file()
+    panel.ac_info_init()
+    panel.fleet_init.wait()
+    default_settings_ids(panel)
+    panel.delta_info_init()
+    return panel, interface
+
+# Offline replays (no settings_ids in the .json, no Paparazzi libs) leave the setting indexes
+# unknown: the radius commands use the ones of the synthetic fleets instead
+def default_settings_ids(panel):
+    from fleet_emulator import DEFAULT_SETTINGS_IDS
+
+    unresolved = [ac_info for ac_info in panel.conf.ac_info_list if None in ac_info.ac._settings_ids.values()]
+    for ac_info in unresolved:
+        ids = ac_info.ac._settings_ids
+        ids.update({key: index for key, index in DEFAULT_SETTINGS_IDS.items() if ids.get(key) is None})
+        panel.registry.register_settings(ac_info.ac.id, ids)
+        ac_info.status = True
+    if unresolved:
+        msg = "WARNING: unknown setting indexes of AC-{:s}, replaying with the defaults {:s} -".format(
+            ", AC-".join(ac_info.idLabel for ac_info in unresolved), str(DEFAULT_SETTINGS_IDS))
+        panel.log_reporter.log(msg)
+        print(msg)
+
+
+if __name__ == '__main__':
+    import argparse
+    from PySide6.QtCore import QCoreApplication
+
+    parser = argparse.ArgumentParser(description="Replay a .ccfrec recording through the CCF app")
+    parser.add_argument('filename', help=".ccfrec file")
+    parser.add_argument('-json', '--json', dest='json', required=True, help="formation .json file")
+    parser.add_argument('-speed', '--speed', dest='speed', type=float, default=0.,
+                        help="replay speed (1 real time, N times faster, 0 as fast as possible)")
+    parser.add_argument('-save', '--save', dest='save', default=None, help="save the control outputs (.npz)")
+    parser.add_argument('-compare', '--compare', dest='compare', default=None, help="reference outputs (.npz)")
+    parser.add_argument('-tol', '--tol', dest='tolerance', type=float, default=1e-6, help="allowed |u| difference")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    panel, interface = replay_panel(args.json)
+
+    engine = ReplayEngine(panel, args.filename, args.speed)
+    wall0 = time.perf_counter()
+    t, u = engine.run()
+    elapsed = time.perf_counter() - wall0
+    panel.outbound.stop()
+
+    duration = t[-1] - t[0] if t.size else 0.
+    print("{:d} msgs replayed, {:d} CCF ticks over {:.1f} s in {:.2f} s (x{:.0f})".format(
+        engine.msgs, t.size, duration, elapsed, duration / max(elapsed, 1e-9)))
+    print("DL_SETTING msgs recorded: {:d}, replayed radius commands: {:s}".format(
+        engine.recorded_cmds, panel.conf.cmd_filter.summary()))
+    print("Latency on the recorded clock (p50/p95/p99): " + panel.conf.latency.summary(stage=latency.SEND))
+
+    if args.save is not None:
+        np.savez(args.save, t=t, u=u)
+        print("outputs saved to " + args.save)
+
+    if args.compare is not None:
+        ref = np.load(args.compare)
+        if ref["u"].shape != u.shape:
+            print("REGRESSION: {:s} ticks/AC, reference {:s}".format(str(u.shape), str(ref["u"].shape)))
+            sys.exit(1)
+        err = np.max(np.abs(ref["u"] - u), initial=0.)
+        print("max |u - u_ref| = {:.3g}".format(err))
+        if not err <= args.tolerance:
+            print("REGRESSION")
+            sys.exit(1)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Persistent cache of the PaparazziACSettings name -> index lookups.
+
+The generated settings file of an aircraft ($PAPARAZZI_HOME/var/aircrafts/
+<name>/settings.xml, <name> from conf/conf.xml) is only parsed when it is
+not in the cache:
+    - an entry is valid while the file keeps its mtime and size,
+    - a rebuilt file (new mtime) with the same content hash is still a hit,
+    - any other change invalidates the entry, and entries of removed files
+      are dropped when the cache is loaded.
+The lookup tables are shared in memory between the aircraft whose settings
+have the same content (e.g. a fleet of the same airframe). The cache file is
+only rewritten when its entries changed, once the running lookups (or the
+enclosing batch()) are over.
+
+    -> python3 settings_cache.py 1 2 3      (lookup tables of AC 1, 2 and 3)
+    -> python3 settings_cache.py -clear
+"""
+
+import sys
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from os import path, getenv, stat, replace, makedirs, remove
+from collections import namedtuple
+from xml.etree import ElementTree
+
+# --- Paparazzi python libs (only needed on cache misses)
+PPRZ_HOME = getenv("PAPARAZZI_HOME", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
+PPRZ_SRC = getenv("PAPARAZZI_SRC", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
+sys.path.append(PPRZ_HOME + "/var/lib/python/")
+sys.path.append(PPRZ_SRC + "/sw/lib/python")
+
+try:
+    from settings_xml_parse import PaparazziACSettings
+except ImportError:
+    PaparazziACSettings = None
+# ---
+
+CACHE_FILE = getenv("CCF_SETTINGS_CACHE", path.join(
+    getenv("XDG_CACHE_HOME", path.join(path.expanduser("~"), ".cache")), "pprz_tools", "settings_lookup.json"))
+CACHE_VERSION = 1
+
+# Same interface as the settings of PaparazziACSettings.name_lookup (only .index is used)
+Setting = namedtuple("Setting", ("name", "index"))
+
+"""\
+Name -> index table and group names of one settings file
+"""
+class SettingsLookup:
+    def __init__(self, names, groups):
+        self.names = names      # {name: index}
+        self.groups = groups    # top level group names
+
+    @property
+    def name_lookup(self):
+        return {name: Setting(name, index) for name, index in self.names.items()}
+
+def file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class SettingsCache:
+    def __init__(self, cache_file=CACHE_FILE, pprz_home=PPRZ_HOME):
+        self.cache_file = cache_file
+        self.conf_xml = path.join(pprz_home, "conf", "conf.xml")
+        self.aircrafts_dir = path.join(pprz_home, "var", "aircrafts")
+        self._lock = threading.Lock()
+        self._ac_names = None       # (conf.xml mtime, {ac_id: name})
+        self._entries = None        # settings path -> {"mtime_ns", "size", "hash"}
+        self._tables = {}           # hash -> SettingsLookup (shared)
+        self._parsing = {}          # hash -> Event set when its parse ends
+        self._holds = 0             # running lookups and batches (the file is saved when 0)
+        self._dirty = False         # entries changed since the last save
+        self.hits = 0
+        self.misses = 0
+
+    # Settings file of ac_id (None if conf.xml doesn't know it)
+    def settings_file(self, ac_id):
+        try:
+            mtime = stat(self.conf_xml).st_mtime_ns
+        except OSError:
+            return None
+        if self._ac_names is None or self._ac_names[0] != mtime:
+            names = {}
+            try:
+                root = ElementTree.parse(self.conf_xml).getroot()
+            except ElementTree.ParseError:
+                return None
+            for node in root.iter("aircraft"):
+                try:
+                    names[int(node.get("ac_id"))] = node.get("name")
+                except (TypeError, ValueError):
+                    continue
+            self._ac_names = (mtime, names)
+        name = self._ac_names[1].get(int(ac_id))
+        return None if name is None else path.join(self.aircrafts_dir, name, "settings.xml")
+
+    def load(self):
+        self._entries = {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_VERSION:
+            return
+        tables = data.get("tables", {})
+        for filename, entry in data.get("files", {}).items():
+            table = tables.get(entry.get("hash"))
+            if table is None or not path.exists(filename):
+                continue
+            self._entries[filename] = entry
+            if entry["hash"] not in self._tables:
+                self._tables[entry["hash"]] = SettingsLookup(table["names"], table["groups"])
+        self._dirty = len(self._entries) != len(data.get("files", {})) # entries of removed files
+
+    def save(self):
+        used = {entry["hash"] for entry in self._entries.values()}
+        data = {"version": CACHE_VERSION, "files": self._entries,
+                "tables": {h: {"names": t.names, "groups": t.groups} for h, t in self._tables.items() if h in used}}
+        try:
+            makedirs(path.dirname(self.cache_file), exist_ok=True)
+            tmp = self.cache_file + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            replace(tmp, self.cache_file)
+            self._dirty = False
+        except OSError as e:
+            print("WARNING: settings cache not saved ({:s})".format(str(e)))
+
+    # Defer the cache file writes until the matching release()
+    def hold(self):
+        with self._lock:
+            self._holds += 1
+
+    def release(self):
+        with self._lock:
+            self._holds -= 1
+            if self._holds == 0 and self._dirty:
+                self.save()
+
+    # Lookups of a whole fleet written to the cache file once
+    @contextmanager
+    def batch(self):
+        self.hold()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    # SettingsLookup of ac_id (parsed only when its settings file is not in the cache).
+    # Thread safe: the files are hashed and parsed out of the lock, and concurrent
+    # lookups of the same content wait for a single parse.
+    def lookup(self, ac_id):
+        self.hold()
+        try:
+            return self._lookup(ac_id)
+        finally:
+            self.release()
+
+    def _lookup(self, ac_id):
+        with self._lock:
+            if self._entries is None:
+                self.load()
+            filename = self.settings_file(ac_id)
+            try:
+                st = stat(filename)
+            except (TypeError, OSError):
+                filename = None # unknown aircraft or layout: no cache
+            else:
+                entry = self._entries.get(filename)
+                if entry is not None and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                    self.hits += 1
+                    return self._tables[entry["hash"]]
+        if filename is None:
+            return parse(ac_id)
+
+        # New or rebuilt file: the content decides
+        digest = file_hash(filename)
+        with self._lock:
+            table = self._tables.get(digest)
+            parsing = self._parsing.get(digest)
+            owner = table is None and parsing is None
+            if owner:
+                parsing = self._parsing[digest] = threading.Event()
+
+        if owner:
+            try:
+                table = parse(ac_id)
+            finally:
+                with self._lock:
+                    del self._parsing[digest]
+                    if table is not None:
+                        self._tables[digest] = table
+                        self.misses += 1
+                parsing.set()
+        elif table is None:
+            parsing.wait()
+            table = self._tables.get(digest)
+            if table is None:
+                raise LookupError("AC-{:s} settings could not be parsed".format(str(ac_id)))
+
+        with self._lock:
+            if not owner:
+                self.hits += 1
+            entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "hash": digest}
+            if self._entries.get(filename) != entry:
+                self._entries[filename] = entry
+                self._dirty = True
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._tables = {}
+            self._dirty = False
+            if path.exists(self.cache_file):
+                remove(self.cache_file)
+
+    def summary(self):
+        return "settings cache {:d} hits, {:d} parsed".format(self.hits, self.misses)
+
+# Parse the settings of ac_id with the Paparazzi python libs
+def parse(ac_id):
+    if PaparazziACSettings is None:
+        raise LookupError("AC-{:s} settings are not cached and the Paparazzi python libs are not available"
+                          .format(str(ac_id)))
+    settings = PaparazziACSettings(int(ac_id))
+    return SettingsLookup({name: setting.index for name, setting in settings.name_lookup.items()},
+                          [group.name for group in settings.groups])
+
+_default_cache = None
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SettingsCache()
+    return _default_cache
+
+def lookup(ac_id):
+    return default_cache().lookup(ac_id)
+
+# Drop-in for PaparazziACSettings(ac_id).name_lookup (a new dict, shared Setting values)
+def name_lookup(ac_id):
+    return lookup(ac_id).name_lookup
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cached PaparazziACSettings lookups")
+    parser.add_argument('ac_ids', nargs='*', type=int, help="aircraft ids")
+    parser.add_argument('-clear', '--clear', dest='clear', action='store_true', help="remove the cache file")
+    args = parser.parse_args()
+
+    cache = default_cache()
+    if args.clear:
+        cache.clear()
+        print("removed " + cache.cache_file)
+    with cache.batch():
+        tables = [(ac_id, cache.lookup(ac_id)) for ac_id in args.ac_ids]
+    for ac_id, table in tables:
+        print("AC-{:d}: {:d} settings, groups {:s}".format(ac_id, len(table.names), ", ".join(table.groups)))
+    if args.ac_ids:
+        print(cache.summary() + " (" + cache.cache_file + ")")
@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""\
+Pluggable message transports of the CCF app.
+
+    ivy     IvyMessagesInterface (pprzlink), the default
+    udp     pprzlink binary messages straight to the aircraft (or proxy) UDP
+            ports, without the Ivy hop and its text serialization
+    local   in-process bus with the same subscribe/send semantics, for tests
+            and load benchmarks without Ivy, network or Paparazzi install
+
+The transport is selected with open_interface(name, transport) or with the
+CCF_TRANSPORT environment variable (CCF_UDP_LINKS for the udp ports).
+Without pprzlink, Message falls back to LocalMessage, so the app can still
+build and exchange its messages.
+
+    -> CCF_TRANSPORT=local python3 ccf_app.py
+    -> python3 ccf_app.py -transport udp -udp_links 5:4248:4249,6:4250:4251
+    -> python3 transport.py -rates 1000,10000,100000 -t 2
+"""
+
+import sys
+import time
+import queue
+import threading
+from os import path, getenv
+
+PPRZ_HOME = getenv("PAPARAZZI_HOME", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
+PPRZ_SRC = getenv("PAPARAZZI_SRC", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
+sys.path.append(PPRZ_HOME + "/var/lib/python/")
+sys.path.append(PPRZ_SRC + "/sw/lib/python")
+
+TRANSPORTS = ("ivy", "udp", "local")
+DEFAULT_TRANSPORT = getenv("CCF_TRANSPORT", "ivy")
+DEFAULT_UDP_LINKS = getenv("CCF_UDP_LINKS", "")
+
+# GCS ID, address, OUT (uplink) port, IN (downlink) port
+DEFAULT_ADDRESS = "127.0.0.1"
+gcs_conf = [0, DEFAULT_ADDRESS, 4243, 4242]
+
+"""\
+PprzMessage stand-in: ordered named fields, read by name or position
+"""
+class LocalMessage:
+    def __init__(self, msg_class, name, fields=()):
+        self.msg_class = msg_class
+        self.name = name
+        self._names = [field for field, _ in fields]
+        self._values = [value for _, value in fields]
+
+    def __getitem__(self, field):
+        return self._values[self._names.index(field)]
+
+    def __setitem__(self, field, value):
+        if field in self._names:
+            self._values[self._names.index(field)] = value
+        else:
+            self._names.append(field)
+            self._values.append(value)
+
+    def get_field(self, idx):
+        return self._values[idx]
+
+    @property
+    def fieldnames(self):
+        return list(self._names)
+
+    @property
+    def fieldvalues(self):
+        return list(self._values)
+
+    def __str__(self):
+        return "{:s}.{:s} {:s}".format(self.msg_class, self.name,
+            " ".join("{}={}".format(n, v) for n, v in zip(self._names, self._values)))
+
+# --- PprzLink (optional)
+try:
+    from pprzlink.message import PprzMessage as Message
+except ImportError:
+    Message = LocalMessage
+try:
+    from pprzlink.ivy import IvyMessagesInterface
+except ImportError:
+    IvyMessagesInterface = None
+try:
+    from pprzlink.udp import UdpMessagesInterface
+except ImportError:
+    UdpMessagesInterface = None
+# ---
+
+"""\
+In-process message bus.
+
+Like Ivy, the callbacks are run on a single dispatcher thread (or directly
+in send() with threaded=False), in publishing order. A subscription to a
+message (or to its name) only receives the messages with that name; a
+subscription to None receives everything. A callback that raises is counted
+in `errors` (and reported once per kind of error), the other callbacks and
+the next messages are still delivered.
+"""
+class LocalBus:
+    def __init__(self, threaded=True, log_reporter=None):
+        self.threaded = threaded
+        self.log_reporter = log_reporter
+        self._subscribers = []  # (owner, name or None, callback)
+        self._by_name = {}
+        self._catch_all = []
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = None
+
+        self.published = 0
+        self.delivered = 0
+        self.errors = 0
+        self._error_kinds = set() # (callback, msg name, exception type) already reported
+
+    def subscribe(self, owner, callback, name=None):
+        with self._lock:
+            self._subscribers.append((owner, name, callback))
+            self._rebuild()
+
+    def unsubscribe_all(self, owner):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] is not owner]
+            self._rebuild()
+
+    def _rebuild(self):
+        by_name = {}
+        catch_all = [cb for _, name, cb in self._subscribers if name is None]
+        for _, name, cb in self._subscribers:
+            if name is not None:
+                by_name.setdefault(name, list(catch_all)).append(cb)
+        self._by_name = by_name
+        self._catch_all = catch_all
+
+    def publish(self, sender_id, msg):
+        self.published += 1
+        if not self.threaded:
+            self._dispatch(sender_id, msg)
+            return
+        with self._idle:
+            self._pending += 1
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self.run, name="local_bus", daemon=True)
+                    self._thread.start()
+        self._queue.put((sender_id, msg))
+
+    def _dispatch(self, sender_id, msg):
+        callbacks = self._by_name.get(msg.name, self._catch_all)
+        for callback in callbacks:
+            try:
+                callback(sender_id, msg)
+            except Exception as e:
+                self.error(callback, msg, e)
+        self.delivered += len(callbacks)
+
+    def error(self, callback, msg, e):
+        self.errors += 1
+        kind = (getattr(callback, "__qualname__", repr(callback)), msg.name, type(e).__name__)
+        if kind in self._error_kinds:
+            return
+        self._error_kinds.add(kind)
+        log = "ERROR: local bus callback {:s} failed on {:s} ({:s}) -".format(kind[0], msg.name, repr(e))
+        if self.log_reporter is not None:
+            self.log_reporter.log(log)
+        else:
+            print(log)
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._dispatch(*item)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._idle.notify_all()
+
+    # Wait until every published message is dispatched
+    def wait_idle(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def pending(self):
+        return self._pending
+
+_default_bus = None
+
+def default_bus():
+    global _default_bus
+    if _default_bus is None:
+        _default_bus = LocalBus()
+    return _default_bus
+
+"""\
+IvyMessagesInterface-like endpoint of a LocalBus
+"""
+class LocalInterface:
+    def __init__(self, name, bus=None, sender_id=0):
+        self.name = name
+        self.bus = default_bus() if bus is None else bus
+        self.sender_id = sender_id
+
+    # msg: message (or name) to receive, None for every message
+    def subscribe(self, callback, msg=None):
+        name = getattr(msg, "name", msg)
+        self.bus.subscribe(self, callback, name)
+
+    def unsubscribe_all(self):
+        self.bus.unsubscribe_all(self)
+
+    def send(self, msg, sender_id=None):
+        self.bus.publish(self.sender_id if sender_id is None else sender_id, msg)
+
+    def shutdown(self):
+        self.unsubscribe_all()
+
+# {ac_id: (out_port, in_port)} from "ac_id:out:in,..." (pprzlink_proxy --ac convention, AC side ports)
+def parse_udp_links(links):
+    parsed = {}
+    for link in filter(None, links.split(",")):
+        ac_id, out_port, in_port = (int(v) for v in link.split(":"))
+        parsed[ac_id] = (out_port, in_port)
+    return parsed
+
+"""\
+IvyMessagesInterface-like endpoint talking pprzlink over UDP.
+
+Every aircraft link is given from the aircraft side, as in proxy_sim.py:
+the aircraft sends its telemetry to its OUT port (where we listen) and
+listens on its IN port (where we send). Aircraft without their own link
+use the gcs_conf ports. The ground-only messages are sent as their
+datalink counterparts (DL_SETTING -> SETTING, GET_DL_SETTING -> GET_SETTING).
+
+With aircraft=True the roles are swapped (listen on the IN ports for
+datalink msgs, send telemetry to the OUT ports), e.g. for the fleet emulator.
+Like on Ivy, callbacks never run concurrently.
+"""
+class UdpInterface:
+    def __init__(self, name, links=None, address=DEFAULT_ADDRESS, gcs_id=gcs_conf[0], aircraft=False):
+        if UdpMessagesInterface is None:
+            raise RuntimeError("pprzlink.udp is not available")
+        self.name = name
+        self.address = address
+        self.gcs_id = gcs_id
+        self.aircraft = aircraft
+        self.links = parse_udp_links(DEFAULT_UDP_LINKS) if links is None else dict(links)
+        self.default_link = (gcs_conf[3], gcs_conf[2])
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+        listen_ports = {self._ports(ac_id)[0] for ac_id in self.links} | {self._ports(None)[0]}
+        msg_class = "datalink" if aircraft else "telemetry"
+        self._udp = []
+        for port in sorted(listen_ports):
+            udp = UdpMessagesInterface(self._udp_cb, uplink_port=self._ports(None)[1], downlink_port=port,
+                                       msg_class=msg_class)
+            udp.start()
+            self._udp.append(udp)
+
+    # (listen port, send port) of ac_id
+    def _ports(self, ac_id):
+        out_port, in_port = self.links.get(ac_id, self.default_link)
+        return (in_port, out_port) if self.aircraft else (out_port, in_port)
+
+    def _udp_cb(self, sender_id, address, msg, length, receiver_id=0, component_id=0):
+        with self._lock:
+            for name, callback in self._subscribers:
+                if name is None or name == msg.name:
+                    callback(sender_id, msg)
+
+    def subscribe(self, callback, msg=None):
+        name = getattr(msg, "name", msg)
+        with self._lock:
+            self._subscribers.append((name, callback))
+
+    def unsubscribe_all(self):
+        with self._lock:
+            self._subscribers = []
+
+    def send(self, msg, sender_id=None):
+        if msg.name == "DL_SETTING":
+            dl_msg = Message("datalink", "SETTING")
+            dl_msg['index'], dl_msg['ac_id'], dl_msg['value'] = msg['index'], msg['ac_id'], msg['value']
+            msg = dl_msg
+        elif msg.name == "GET_DL_SETTING":
+            dl_msg = Message("datalink", "GET_SETTING")
+            dl_msg['index'], dl_msg['ac_id'] = msg['index'], msg['ac_id']
+            msg = dl_msg
+
+        if self.aircraft:
+            ac_id = sender_id
+        else:
+            ac_id = int(msg['ac_id']) if 'ac_id' in msg.fieldnames else None
+            sender_id = self.gcs_id if sender_id is None else sender_id
+        port = self._ports(ac_id)[1]
+        self._udp[0].send(msg, sender_id, (self.address, port))
+
+    def shutdown(self):
+        for udp in self._udp:
+            udp.stop()
+        for udp in self._udp:
+            udp.join()
+
+# Interface of the given transport ("ivy", "udp", "local"; CCF_TRANSPORT by default)
+def open_interface(name, transport=None, bus=None, udp_links=None, aircraft=False):
+    transport = DEFAULT_TRANSPORT if transport is None else transport
+    if transport == "local":
+        return LocalInterface(name, bus)
+    if transport == "udp":
+        links = None if udp_links is None else parse_udp_links(udp_links)
+        return UdpInterface(name, links, aircraft=aircraft)
+    if transport == "ivy":
+        if IvyMessagesInterface is None:
+            raise RuntimeError("pprzlink is not available, use the local transport")
+        return IvyMessagesInterface(name)
+    raise ValueError("unknown transport '{:s}' (choose from {:s})".format(transport, ", ".join(TRANSPORTS)))
+
+"""\
+Publishes the messages of make_msg(k) -> (sender_id, msg) at `rate` msgs/s
+on its own thread, and measures the achieved rate and the dispatch lag of
+the bus (time between publishing a message and its last callback).
+"""
+class Injector:
+    def __init__(self, interface, make_msg, rate, duration):
+        self.interface = interface
+        self.make_msg = make_msg
+        self.rate = rate
+        self.duration = duration
+        self.sent = 0
+        self.elapsed = 0.
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="injector", daemon=True)
+        self._thread.start()
+
+    def join(self):
+        self._thread.join()
+
+    def run(self):
+        period = 1. / self.rate
+        t0 = time.perf_counter()
+        n_total = int(self.rate * self.duration)
+        while self.sent < n_total:
+            # Catch up in bursts when sleeping is coarser than the period
+            due = min(n_total, int((time.perf_counter() - t0) / period) + 1)
+            while self.sent < due:
+                sender_id, msg = self.make_msg(self.sent)
+                self.interface.send(msg, sender_id)
+                self.sent += 1
+            sleep = t0 + self.sent * period - time.perf_counter()
+            if sleep > 0:
+                time.sleep(sleep)
+        self.elapsed = time.perf_counter() - t0
+
+    def achieved_rate(self):
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Throughput of the local bus")
+    parser.add_argument('-rates', '--rates', dest='rates', default="1000,10000,100000", help="injection rates (msgs/s)")
+    parser.add_argument('-t', '--t', dest='duration', type=float, default=2., help="injection time per rate (s)")
+    parser.add_argument('-n', '--n', dest='n_ac', type=int, default=50, help="number of aircraft")
+    args = parser.parse_args()
+
+    for rate in [float(r) for r in args.rates.split(",")]:
+        bus = LocalBus()
+        received = [0]
+        lag = [0.]
+        app = LocalInterface("app", bus)
+
+        def nav_cb(ac_id, msg):
+            received[0] += 1
+            lag[0] = max(lag[0], time.perf_counter() - msg.get_field(0))
+        app.subscribe(nav_cb, "NAVIGATION")
+
+        def make_msg(k):
+            msg = LocalMessage("telemetry", "NAVIGATION", (("t", time.perf_counter()), ("pos_x", 0.), ("pos_y", 0.)))
+            return 1 + k % args.n_ac, msg
+
+        injector = Injector(LocalInterface("injector", bus), make_msg, rate, args.duration)
+        injector.start()
+        injector.join()
+        bus.wait_idle()
+        print("{:>9.0f} msgs/s requested: {:>9.0f} msgs/s injected, {:d}/{:d} received, max lag {:.1f} ms".format(
+            rate, injector.achieved_rate(), received[0], injector.sent, lag[0] * 1e3))
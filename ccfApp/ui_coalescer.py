@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2023 Jesús Bautista Villar <jesbauti20@gmail.com>
+#
+# This file is part of paparazzi.
+#
+# paparazzi is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# paparazzi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with paparazzi; see the file COPYING.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import threading
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+"""\
+Coalesces Qt property notifications into one refresh per UI frame.
+
+Any thread can mark(obj, "signal_name"); marks of the same signal within a
+frame are merged, and the pending signals are emitted once from the GUI
+thread at `rate_hz`. The merged marks are counted as dropped notifications.
+"""
+class UpdateCoalescer(QObject):
+
+    stats_changed = Signal()
+
+    def __init__(self, rate_hz=30, stats_period=1.):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._pending = {}
+
+        self.requested = 0
+        self.emitted = 0
+        self.dropped = 0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(1000 / rate_hz))
+        self.timer.timeout.connect(self.flush)
+        self._stats_every = max(1, int(stats_period * rate_hz))
+        self._flushes = 0
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def mark(self, obj, signal_name):
+        key = (id(obj), signal_name)
+        with self._lock:
+            self.requested += 1
+            if key in self._pending:
+                self.dropped += 1
+            else:
+                self._pending[key] = (obj, signal_name)
+
+    # Emit the pending notifications (GUI thread)
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for obj, signal_name in pending.values():
+            getattr(obj, signal_name).emit()
+        self.emitted += len(pending)
+
+        self._flushes += 1
+        if self._flushes % self._stats_every == 0:
+            self.stats_changed.emit()
+
+    def summary(self):
+        return "UI {:d} emitted, {:d} dropped".format(self.emitted, self.dropped)
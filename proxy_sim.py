@@ -24,9 +24,11 @@
 Script to generate an easy call for pprzlink_proxy.
 	-> python3 proxy_sim.py -ids 5,6 -pi 4248,4250 -po 4249,4251
 	-> python3 proxy_sim.py -ids 5,6,200 -pi 4248,4250,4252 -po 4249,4251,4253
+	-> python3 proxy_sim.py -ids 5,6 -pi 4248,4250 -po 4249,4251 -metrics 9465
 '''
 
 import os
+import sys
 from time import sleep
 
 PAPARAZZI_HOME = os.getenv("PAPARAZZI_HOME")
@@ -41,6 +43,23 @@ INIT_AC_ID = 1 # should be more than 0 and less than 255
 
 NUM_AGENTS = 3
 
+# Metrics endpoint of the CCF app (ccfApp/metrics.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ccfApp"))
+
+# Serve the Ivy traffic bridged by the proxy (msgs per type and aircraft) in the Prometheus format
+def start_metrics(port, n_links):
+	from metrics import serve, BusMetrics
+	from transport import open_interface
+
+	registry, server = serve(port, prefix="proxy_sim")
+	if registry is None:
+		return None
+	registry.gauge_fn("links", "Aircraft links of pprzlink_proxy", lambda: n_links)
+	interface = open_interface("Proxy metrics", "ivy")
+	BusMetrics(registry).subscribe(interface, lambda ac_id, msg: None)
+	print("Metrics served on http://127.0.0.1:{:d}/metrics".format(server.port))
+	return interface
+
 # -------------------------------------------------------------------------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -57,6 +76,8 @@ if __name__ == '__main__':
 	parser.add_argument('-ids', '--ids', dest='ids', default=None, help="AC IDs")
 	parser.add_argument('-pi', '--pi', dest='in_ports', default=None, help="AC ports in")
 	parser.add_argument('-po', '--po', dest='out_ports', default=None, help="AC ports out")
+	parser.add_argument('-metrics', '--metrics', dest='metrics_port', type=int, default=None,
+						help="serve Prometheus metrics of the Ivy traffic on this local port")
 	args = parser.parse_args()
 
 	verbose = args.verbose
@@ -86,6 +107,10 @@ if __name__ == '__main__':
 
 			pprz_proxy_args += "--ac=" + str(ac_id) + ":" + str(out_port) + ":" + str(in_port) + " "
 
+	metrics_interface = None
+	if args.metrics_port is not None:
+		metrics_interface = start_metrics(args.metrics_port, pprz_proxy_args.count("--ac="))
+
 	sleep(1)
 
 	try:
@@ -99,6 +124,9 @@ if __name__ == '__main__':
 
 	except (KeyboardInterrupt, SystemExit):
 		pass
+
+	if metrics_interface is not None:
+		metrics_interface.shutdown()
 		
 		
 
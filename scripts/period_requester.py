@@ -26,6 +26,7 @@ agents nps simulations.
 
 Usage example: 
     ./send_multisim_settings.py -ad_ids 5,6,7 -v
+    ./period_requester.py -ac_id 5 -transport local     (dry run on the local bus)
 '''
 
 import sys
@@ -34,15 +35,18 @@ from time import sleep
 
 import numpy as np
 
-PPRZ_HOME = getenv("PAPARAZZI_HOME")
-PPRZ_SRC = getenv("PAPARAZZI_SRC")
+PPRZ_HOME = getenv("PAPARAZZI_HOME", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
+PPRZ_SRC = getenv("PAPARAZZI_SRC", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
 
 sys.path.append(PPRZ_HOME + "/var/lib/python/")
 sys.path.append(PPRZ_SRC + "/sw/lib/python")
 
-from pprzlink.ivy import IvyMessagesInterface
-from pprzlink.message import PprzMessage
-from settings_xml_parse import PaparazziACSettings
+# --- PprzLink (through the pluggable transports of the CCF app: ivy, udp or local,
+# the local bus and its messages don't need pprzlink nor a Paparazzi install)
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), "../ccfApp"))
+from transport import open_interface, Message as PprzMessage
+# ---
+from metrics import serve, BusMetrics
 
 DEFAULT_ADDRESS = "127.0.0.1"
 
@@ -50,15 +54,23 @@ DEFAULT_ADDRESS = "127.0.0.1"
 gcs_conf = [0, DEFAULT_ADDRESS, 4243, 4242]
 
 class sender:
-    def __init__(self, ac_id) -> None:
+    def __init__(self, ac_id, interface=None, bus_metrics=None) -> None:
         self.ac_id = ac_id
-        self.interface = IvyMessagesInterface("Periodic DL_VALUE requester")
+        # Bus interface (CCF_TRANSPORT, Ivy by default) or the given one
+        self.interface = open_interface("Periodic DL_VALUE requester") if interface is None else interface
+
+        # Requests sent and DL_VALUE replies counted for the metrics endpoint
+        self.bus_metrics = bus_metrics
+        if bus_metrics is not None:
+            bus_metrics.subscribe(self.interface, lambda ac_id, msg: None, PprzMessage("telemetry", "DL_VALUE"))
 
     def get_dl_value(self):
         msg = PprzMessage("ground", "GET_DL_SETTING")
         msg['ac_id'] = self.ac_id
         msg["index"] = 0
         self.interface.send(msg)
+        if self.bus_metrics is not None:
+            self.bus_metrics.on_sent(self.ac_id, msg)
 
     def stop(self):
         # Stop IVY interface
@@ -73,6 +85,12 @@ if __name__ == '__main__':
     parser.add_argument('-f', '--f', dest='freq', type=float, default=0.1, help="DL_VALUE request frequency (time in seconds between messages)")
 
     # ---
+    parser.add_argument('-udp_links', '--udp_links', dest='udp_links', default=None,
+                        help="talk pprzlink over UDP instead of Ivy: ac_id:out_port:in_port,... (AC side ports)")
+    parser.add_argument('-transport', '--transport', dest='transport', default=None,
+                        help="message transport: ivy, udp or local (CCF_TRANSPORT by default, udp with -udp_links)")
+    parser.add_argument('-metrics', '--metrics', dest='metrics_port', type=int, default=None,
+                        help="serve Prometheus metrics on this local port")
     args = parser.parse_args()
     
     # Script parameters and setting
@@ -81,7 +99,18 @@ if __name__ == '__main__':
     # ---
     
     if ac_id is not None:
-        ac_sender = sender(ac_id)
+        transport = args.transport
+        if transport is None and args.udp_links is not None:
+            transport = "udp"
+        interface = open_interface("Periodic DL_VALUE requester", transport, udp_links=args.udp_links)
+
+        bus_metrics = None
+        if args.metrics_port is not None:
+            registry, server = serve(args.metrics_port, prefix="period_requester")
+            if registry is not None:
+                bus_metrics = BusMetrics(registry)
+                registry.gauge_fn("request_period_seconds", "Time between DL_VALUE requests", lambda: freq)
+        ac_sender = sender(ac_id, interface, bus_metrics)
 
         try:
             while (True):
@@ -26,6 +26,7 @@ agents nps simulations.
 
 Usage example: 
     ./send_multisim_settings.py -ad_ids 5,6,7 -v
+    ./send_settings_multisim.py -ac_ids 5,6,7 -transport local     (dry run on the local bus)
 '''
 
 import sys
@@ -34,16 +35,18 @@ from time import sleep
 
 import numpy as np
 
-PPRZ_HOME = getenv("PAPARAZZI_HOME")
-PPRZ_SRC = getenv("PAPARAZZI_SRC")
+PPRZ_HOME = getenv("PAPARAZZI_HOME", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
+PPRZ_SRC = getenv("PAPARAZZI_SRC", path.normpath(path.join(path.dirname(path.abspath(__file__)), '../../../../')))
 
 sys.path.append(PPRZ_HOME + "/var/lib/python/")
 sys.path.append(PPRZ_SRC + "/sw/lib/python")
 
-from pprzlink.ivy import IvyMessagesInterface
-from pprzlink.message import PprzMessage
-from settings_xml_parse import PaparazziACSettings
-import pprzlink.udp
+# --- PprzLink (through the pluggable transports of the CCF app: ivy, udp or local,
+# the local bus and its messages don't need pprzlink nor a Paparazzi install)
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), "../ccfApp"))
+from transport import open_interface, Message as PprzMessage
+# ---
+import settings_cache # cached PaparazziACSettings lookups
 
 DEFAULT_ADDRESS = "127.0.0.1"
 
@@ -53,21 +56,23 @@ gcs_conf = [0, DEFAULT_ADDRESS, 4243, 4242]
 class Aircraft:
     def __init__(self, ac_id):
         self.id = ac_id
-        self.settings = PaparazziACSettings(ac_id).name_lookup.copy() # It's a dictionary   
+        self.settings = settings_cache.name_lookup(ac_id) # It's a dictionary (parsed once per settings file)
 
 class settings_sender:
-    def __init__(self, ac_ids):
+    def __init__(self, ac_ids, interface=None):
         self.ac_ids = ac_ids
 
         try:
-            self.aircrafts = [Aircraft(id) for id in self.ac_ids]
+            with settings_cache.default_cache().batch(): # cache file written once
+                self.aircrafts = [Aircraft(id) for id in self.ac_ids]
 
         except Exception as e:
             print(e)
             print("Error while loading PaparazziACSettings")
+            self.aircrafts = []
 
-        # Start IVY interface
-        self.interface = IvyMessagesInterface("Settings Sender")
+        # Start the bus interface (CCF_TRANSPORT, Ivy by default) or use the given one
+        self.interface = open_interface("Settings Sender") if interface is None else interface
         
 
     def new_ac(self, ac_id):
@@ -95,9 +100,12 @@ class settings_sender:
 
         if type(index) == str:
             for ac in self.aircrafts:
-                if ac.id in ac_ids:
+                if ac.id == ac_id and index in ac.settings:
                     index = ac.settings[index].index
                     break
+            else:
+                print("send_setting: setting \'" + index + "\' of " + str(ac_id) + " not found")
+                return False
 
         if ac_id in self.ac_ids:
             msga = PprzMessage("datalink", "SETTING")
@@ -152,6 +160,10 @@ if __name__ == '__main__':
     parser.add_argument('-block_id', '--block_id', dest='block_id', type=int, default=None, help="Block ID")
     # ---
 
+    parser.add_argument('-udp_links', '--udp_links', dest='udp_links', default=None,
+                        help="talk pprzlink over UDP instead of Ivy: ac_id:out_port:in_port,... (AC side ports)")
+    parser.add_argument('-transport', '--transport', dest='transport', default=None,
+                        help="message transport: ivy, udp or local (CCF_TRANSPORT by default, udp with -udp_links)")
     args = parser.parse_args()
     
     # Script parameters and setting
@@ -175,7 +187,11 @@ if __name__ == '__main__':
         ac_ids = ac_ids.split(",")
         ac_ids = [int(id) for id in ac_ids]
 
-        sender = settings_sender(ac_ids)
+        transport = args.transport
+        if transport is None and args.udp_links is not None:
+            transport = "udp"
+        interface = open_interface("Settings Sender", transport, udp_links=args.udp_links)
+        sender = settings_sender(ac_ids, interface)
 
         if show_settings:
             sender.settings()